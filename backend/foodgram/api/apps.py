@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        import api.connections  # noqa: F401
+        import api.profiling  # noqa: F401
+        import api.signals  # noqa: F401
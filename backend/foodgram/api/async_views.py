@@ -0,0 +1,195 @@
+import asyncio
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.utils.cache import get_conditional_response
+from rest_framework.response import Response
+
+from api.db_router import current_replica
+from api.threads import in_thread
+from api.views import (IngredientViewSet, RecipeViewSet,
+                       SubscriptionsListAPIView)
+from recipes.models import Favorite, Recipe, RecipeIngredient, ShoppingCart
+from users.models import Follow
+
+
+def group_by_recipe(queryset):
+    groups = defaultdict(list)
+    for item in queryset:
+        groups[item.recipe_id].append(item)
+    return groups
+
+
+def load_tags(recipe_ids):
+    groups = group_by_recipe(Recipe.tags.through.objects.filter(
+        recipe_id__in=recipe_ids).select_related('tag').order_by('tag_id'))
+    return {pk: [item.tag for item in items] for pk, items in groups.items()}
+
+
+def load_ingredients(recipe_ids):
+    return group_by_recipe(RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids).select_related('ingredient'))
+
+
+def load_user_flags(user, recipe_ids, author_ids):
+    if not user.is_authenticated:
+        return set(), set(), set()
+    return (
+        set(Favorite.objects.filter(
+            user=user, recipe_id__in=recipe_ids
+        ).values_list('recipe_id', flat=True)),
+        set(ShoppingCart.objects.filter(
+            user=user, recipe_id__in=recipe_ids
+        ).values_list('recipe_id', flat=True)),
+        set(Follow.objects.filter(
+            user=user, following_id__in=author_ids
+        ).values_list('following_id', flat=True)),
+    )
+
+
+def set_prefetched(instance, name, objects):
+    queryset = getattr(instance, name).get_queryset()
+    queryset._result_cache = list(objects)
+    queryset._prefetch_done = True
+    instance.__dict__.setdefault(
+        '_prefetched_objects_cache', {})[name] = queryset
+
+
+async def load_related(recipes, user):
+    """
+    Загружает теги, ингредиенты и флаги пользователя для рецептов
+    тремя независимыми запросами одновременно и раскладывает их так,
+    как это сделали бы prefetch_related и with_user_flags.
+    """
+    recipe_ids = [recipe.pk for recipe in recipes]
+    author_ids = {recipe.author_id for recipe in recipes}
+    tags, ingredients, (favorited, in_cart, subscribed) = (
+        await asyncio.gather(
+            in_thread(load_tags)(recipe_ids),
+            in_thread(load_ingredients)(recipe_ids),
+            in_thread(load_user_flags)(user, recipe_ids, author_ids),
+        )
+    )
+    for recipe in recipes:
+        set_prefetched(recipe, 'tags', tags.get(recipe.pk, ()))
+        set_prefetched(recipe, 'recipe_ingredients',
+                       ingredients.get(recipe.pk, ()))
+        recipe.is_favorited = recipe.pk in favorited
+        recipe.is_in_shopping_cart = recipe.pk in in_cart
+        recipe.author_is_subscribed = recipe.author_id in subscribed
+
+
+class AsyncViewSetAction:
+    """
+    Асинхронный вариант GET-действия вьюсета DRF для ASGI.
+    Аутентификация, права, фильтрация и сериализация выполняются
+    кодом вьюсета, а ожидание базы не занимает воркер. Остальные
+    методы передаются синхронному представлению.
+    """
+
+    def __init__(self, viewset, actions):
+        self.viewset = viewset
+        self.action = actions['get']
+        self.sync_view = viewset.as_view(actions)
+
+    def as_view(self):
+        async def view(request, **kwargs):
+            return await self(request, **kwargs)
+        # Как и у представлений DRF, CSRF проверяет SessionAuthentication.
+        view.csrf_exempt = True
+        return view
+
+    async def __call__(self, request, **kwargs):
+        if request.method != 'GET':
+            return await sync_to_async(self.sync_view)(request, **kwargs)
+        view = self.viewset()
+        view.action_map = {'get': self.action}
+        view.setup(request, **kwargs)
+        response, replica = await in_thread(self.initial)(
+            view, request, kwargs)
+        # Реплику выбирает view.initial в потоке; следующие вызовы
+        # in_thread копируют контекст корутины и должны её видеть.
+        token = current_replica.set(replica)
+        try:
+            if response is None:
+                try:
+                    response = await self.handle(
+                        view, view.request, **kwargs)
+                except Exception as exc:
+                    response = await in_thread(view.handle_exception)(exc)
+            return await in_thread(self.finalize)(view, response)
+        finally:
+            current_replica.reset(token)
+
+    def initial(self, view, request, kwargs):
+        """Ответ с ошибкой или None и реплика, выбранная для чтения."""
+        view.request = view.initialize_request(request, **kwargs)
+        view.headers = view.default_response_headers
+        try:
+            view.initial(view.request, **kwargs)
+        except Exception as exc:
+            return view.handle_exception(exc), None
+        return None, current_replica.get()
+
+    def finalize(self, view, response):
+        response = view.finalize_response(view.request, response)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    async def handle(self, view, request, **kwargs):
+        return await in_thread(getattr(view, self.action))(
+            request, **kwargs)
+
+
+class AsyncRecipeList(AsyncViewSetAction):
+
+    def __init__(self):
+        super().__init__(RecipeViewSet, {'get': 'list', 'post': 'create'})
+
+    async def handle(self, view, request, **kwargs):
+        view.load_related = False
+        page = await in_thread(self.get_page)(view)
+        await load_related(page, request.user)
+        return await in_thread(self.get_response)(view, page)
+
+    def get_page(self, view):
+        return list(view.paginate_queryset(
+            view.filter_queryset(view.get_queryset())))
+
+    def get_response(self, view, page):
+        return view.get_paginated_response(
+            view.get_serializer(page, many=True).data)
+
+
+class AsyncRecipeDetail(AsyncViewSetAction):
+
+    def __init__(self):
+        super().__init__(RecipeViewSet, {
+            'get': 'retrieve',
+            'put': 'update',
+            'patch': 'partial_update',
+            'delete': 'destroy',
+        })
+
+    async def handle(self, view, request, **kwargs):
+        view.load_related = False
+        etag, last_modified = await in_thread(view.get_validators)(
+            request)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            recipe = await in_thread(view.get_object)()
+            await load_related([recipe], request.user)
+            data = await in_thread(
+                lambda: view.get_serializer(recipe).data)()
+            response = Response(data)
+        return view.patch_validators(response, etag, last_modified)
+
+
+recipe_list = AsyncRecipeList().as_view()
+recipe_detail = AsyncRecipeDetail().as_view()
+ingredient_list = AsyncViewSetAction(
+    IngredientViewSet, {'get': 'list', 'post': 'create'}).as_view()
+subscription_list = AsyncViewSetAction(
+    SubscriptionsListAPIView, {'get': 'list'}).as_view()
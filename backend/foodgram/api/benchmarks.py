@@ -0,0 +1,87 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from recipes.management.commands.seed import SEED_PREFIX
+from users.models import User
+
+SEED_OPTIONS = ('users', 'recipes', 'follows', 'favorites', 'cart', 'seed')
+
+
+def get_host():
+    """Хост, разрешённый в ALLOWED_HOSTS."""
+    return next(
+        (host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'),
+        'localhost'
+    )
+
+
+def get_request_factory():
+    """Фабрика запросов с хостом, разрешённым в ALLOWED_HOSTS."""
+    return APIRequestFactory(SERVER_NAME=get_host())
+
+
+def get_benchmark_user(options, stdout):
+    """
+    Генерирует данные командой seed, если их ещё нет, и возвращает
+    пользователя с наибольшим числом подписок для замеров.
+    """
+    users = User.objects.filter(username__startswith=f'{SEED_PREFIX}_')
+    if not users.exists():
+        call_command('seed', stdout=stdout,
+                     **{key: options[key] for key in SEED_OPTIONS})
+    return users.annotate(
+        follows=Count('user')).order_by('-follows', 'id').first()
+
+
+def percentile(values, percent):
+    """Перцентиль по отсортированному списку методом ближайшего ранга."""
+    index = max(0, -(-len(values) * percent // 100) - 1)
+    return values[int(index)]
+
+
+def consume(response):
+    """Доводит ответ до байтов, как это сделал бы сервер."""
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    else:
+        response.render()
+    return response
+
+
+def measure(view, make_request, repeat, before_request=None):
+    """
+    Выполняет запрос к представлению repeat раз после прогревочного
+    запроса и возвращает перцентили времени ответа и число запросов к БД.
+    """
+    consume(view(make_request()))
+    timings = []
+    queries = []
+    for _ in range(repeat):
+        if before_request is not None:
+            before_request()
+        request = make_request()
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            response = consume(view(request))
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(context.captured_queries))
+    timings.sort()
+    return {
+        'status': response.status_code,
+        'repeat': repeat,
+        'queries': max(queries),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p90_ms': round(percentile(timings, 90), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'max_ms': round(timings[-1], 3),
+    }
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from api.stats import ProcessStats
+
+# Счётчики в памяти процесса: обращение к кэшу при открытии
+# соединения само могло бы открыть соединение с базой.
+connection_stats = ProcessStats(
+    'db_connections', ('created', 'reused', 'wait_us', 'unusable'))
+
+
+def record_checkout(reused, wait=0):
+    """Учитывает выдачу соединения из пула и время ожидания в нём."""
+    connection_stats.add('reused' if reused else 'created')
+    connection_stats.add('wait_us', int(wait * 1_000_000))
+
+
+def get_stats():
+    return connection_stats.get_stats()
+
+
+@receiver(connection_created)
+def count_created(connection, **kwargs):
+    if not getattr(connection, 'pooled', False):
+        connection_stats.add('created')
+
+
+@receiver(request_started)
+def check_persistent_connections(**kwargs):
+    """
+    Проверяет постоянные соединения, оставшиеся от прошлых запросов,
+    и закрывает оборвавшиеся, чтобы запрос открыл новое, а не упал
+    на первом обращении к базе.
+    """
+    for connection in connections.all():
+        if connection.connection is None:
+            continue
+        if (settings.DB_CONN_HEALTH_CHECKS
+                and not connection.is_usable()):
+            connection.close()
+            connection_stats.add('unusable')
+        else:
+            connection_stats.add('reused')
@@ -0,0 +1,159 @@
+from array import array
+from collections import Counter, defaultdict
+from itertools import compress, filterfalse
+from operator import truediv
+
+from api.journal import JournaledIndex, get_journal_head
+from recipes.models import RecipeIngredient
+
+COOKABLE_JOURNAL = 'recipe_ingredients'
+# После стольких изменённых рецептов их составы переносятся в общий массив.
+COMPACT_AFTER = 1000
+
+
+class CookableIndex(JournaledIndex):
+    """
+    Состав рецептов в памяти процесса для подбора рецептов по имеющимся
+    ингредиентам. id ингредиентов всех рецептов лежат одним массивом,
+    упорядоченным по рецептам, начало и число строк рецепта - в массивах
+    с номером ячейки, равным id рецепта. Обратный индекс хранит массив
+    id рецептов для каждого ингредиента. Изменённые рецепты обновляются
+    на месте по журналу изменений.
+    """
+
+    journal = COOKABLE_JOURNAL
+
+    def __init__(self):
+        super().__init__()
+        self._postings = None
+        self._ingredients = None
+        self._starts = None
+        self._sizes = None
+        self._changed = None
+
+    @staticmethod
+    def _load_rows(recipe_ids=None):
+        rows = RecipeIngredient.objects.order_by('recipe_id', 'ingredient_id')
+        if recipe_ids is not None:
+            rows = rows.filter(recipe_id__in=recipe_ids)
+        return rows.values_list('recipe_id', 'ingredient_id').iterator()
+
+    def _reserve(self, recipe_id):
+        """Расширяет массивы по id рецепта с запасом, как list.append."""
+        missing = recipe_id + 1 - len(self._sizes)
+        if missing > 0:
+            missing = max(missing, len(self._sizes))
+            self._sizes.frombytes(bytes(missing * self._sizes.itemsize))
+            self._starts.frombytes(bytes(missing * self._starts.itemsize))
+
+    def build(self, rows):
+        """
+        Строит индекс по парам (id рецепта, id ингредиента),
+        упорядоченным по рецептам. Номер журнала читается до строк,
+        чтобы изменения во время построения применились после него.
+        """
+        position = get_journal_head(self.journal)
+        self._postings = defaultdict(lambda: array('I'))
+        self._ingredients = array('I')
+        self._starts = array('I')
+        self._sizes = array('H')
+        self._changed = {}
+        for recipe_id, ingredient_id in rows:
+            self._reserve(recipe_id)
+            if not self._sizes[recipe_id]:
+                self._starts[recipe_id] = len(self._ingredients)
+            self._sizes[recipe_id] += 1
+            self._ingredients.append(ingredient_id)
+            self._postings[ingredient_id].append(recipe_id)
+        self._position = position
+
+    def _install(self, index):
+        self._postings = index._postings
+        self._ingredients = index._ingredients
+        self._starts = index._starts
+        self._sizes = index._sizes
+        self._changed = index._changed
+
+    def _composition(self, recipe_id):
+        if recipe_id in self._changed:
+            return self._changed[recipe_id]
+        if recipe_id >= len(self._sizes):
+            return ()
+        start = self._starts[recipe_id]
+        return self._ingredients[start:start + self._sizes[recipe_id]]
+
+    def _compact(self):
+        """Переносит составы изменённых рецептов в общий массив."""
+        ingredients = array('I')
+        for recipe_id in range(len(self._sizes)):
+            composition = self._composition(recipe_id)
+            self._starts[recipe_id] = len(ingredients)
+            ingredients.extend(composition)
+        self._ingredients = ingredients
+        self._changed = {}
+
+    def _apply(self, recipe_ids):
+        """
+        Перечитывает состав рецептов. Новый состав хранится отдельно
+        от общего массива, удалённые рецепты остаются без ингредиентов.
+        Массив рецептов каждого затронутого ингредиента пересобирается
+        одним проходом на всю пачку изменений.
+        """
+        stale = defaultdict(set)
+        for recipe_id in recipe_ids:
+            for ingredient_id in self._composition(recipe_id):
+                stale[ingredient_id].add(recipe_id)
+            self._reserve(recipe_id)
+            self._sizes[recipe_id] = 0
+            self._changed[recipe_id] = array('I')
+        for ingredient_id, removed in stale.items():
+            self._postings[ingredient_id] = array('I', filterfalse(
+                removed.__contains__, self._postings[ingredient_id]))
+        for recipe_id, ingredient_id in self._load_rows(recipe_ids):
+            self._sizes[recipe_id] += 1
+            self._changed[recipe_id].append(ingredient_id)
+            self._postings[ingredient_id].append(recipe_id)
+        if len(self._changed) >= COMPACT_AFTER:
+            self._compact()
+
+    def search(self, ingredient_ids, limit, min_coverage=0):
+        """
+        Возвращает до limit троек (доля, число совпадений, id рецепта)
+        для рецептов, в составе которых есть хотя бы один из ингредиентов
+        и доля строк состава, закрытых ингредиентами, не ниже min_coverage.
+        Сначала идут рецепты с большей долей, затем с большим числом
+        совпадений, затем более новые.
+        """
+        self._sync()
+        with self._lock:
+            matched = Counter()
+            for ingredient_id in set(ingredient_ids):
+                matched.update(self._postings.get(ingredient_id, ()))
+            recipe_ids = list(matched)
+            counts = list(matched.values())
+            coverages = list(map(
+                truediv, counts, map(self._sizes.__getitem__, recipe_ids)))
+        # Кортежи собираются только для рецептов не ниже limit-й доли:
+        # сортировка чисел и отбор через compress идут без цикла Python.
+        threshold = float(min_coverage)
+        if len(coverages) > limit:
+            threshold = max(
+                threshold, sorted(coverages, reverse=True)[limit - 1])
+        return sorted(
+            compress(zip(coverages, counts, recipe_ids),
+                     map(threshold.__le__, coverages)),
+            reverse=True
+        )[:limit]
+
+    def missing(self, recipe_id, ingredient_ids):
+        """id ингредиентов рецепта, которых нет среди ingredient_ids."""
+        ingredient_ids = set(ingredient_ids)
+        if self._position is None:
+            self._sync()
+        with self._lock:
+            return [ingredient_id
+                    for ingredient_id in self._composition(recipe_id)
+                    if ingredient_id not in ingredient_ids]
+
+
+cookable_index = CookableIndex()
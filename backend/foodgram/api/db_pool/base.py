@@ -0,0 +1,97 @@
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from api.connections import connection_stats, record_checkout
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """
+    Пул соединений процесса: не более size соединений на базу,
+    закрытые Django соединения возвращаются в пул, а не рвутся.
+    """
+
+    def __init__(self, size, timeout):
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def get(self, connect):
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise OperationalError(
+                f'Нет свободных соединений в пуле за {self.timeout} с')
+        wait = time.monotonic() - started
+        try:
+            while True:
+                try:
+                    connection = self._idle.get_nowait()
+                except queue.Empty:
+                    return connect(), False, wait
+                if not connection.closed:
+                    return connection, True, wait
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def put(self, connection):
+        try:
+            if (not connection.closed and connection.get_transaction_status()
+                    != extensions.TRANSACTION_STATUS_IDLE):
+                connection.rollback()
+        except Exception:
+            connection.close()
+        if not connection.closed:
+            self._idle.put(connection)
+        self._slots.release()
+
+    def discard(self, connection):
+        connection.close()
+        self._slots.release()
+
+
+def get_pool(alias):
+    with _pools_lock:
+        if alias not in _pools:
+            _pools[alias] = ConnectionPool(
+                settings.DB_POOL_SIZE, settings.DB_POOL_TIMEOUT)
+        return _pools[alias]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL с пулом соединений внутри процесса."""
+    pooled = True
+
+    def get_new_connection(self, conn_params):
+        pool = get_pool(self.alias)
+        while True:
+            connection, reused, wait = pool.get(
+                lambda: super(DatabaseWrapper, self).get_new_connection(
+                    conn_params))
+            if not reused or not settings.DB_CONN_HEALTH_CHECKS:
+                break
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                connection.rollback()
+                break
+            except Exception:
+                pool.discard(connection)
+                connection_stats.add('unusable')
+        if reused:
+            self.isolation_level = self.settings_dict['OPTIONS'].get(
+                'isolation_level', connection.isolation_level)
+        record_checkout(reused, wait)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            get_pool(self.alias).put(self.connection)
@@ -0,0 +1,65 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_KEY = 'primary_pin:{user_id}'
+# app_label модели, через которую DatabaseCache выбирает базу.
+CACHE_APP_LABEL = 'django_cache'
+
+current_replica = ContextVar('current_replica', default=None)
+
+
+def choose_replica():
+    """Реплика для чтения или None, если реплики не настроены."""
+    if not settings.DATABASE_REPLICAS:
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+def get_cache_timeout(timeout):
+    """
+    Данные, прочитанные с реплики, могут отставать от версии в ключе
+    кэша, поэтому хранятся не дольше окна закрепления за основной базой.
+    """
+    if current_replica.get() is None:
+        return timeout
+    return min(timeout, settings.REPLICA_PIN_SECONDS)
+
+
+def pin_to_primary(user_id):
+    """
+    После записи пользователь читает с основной базы
+    REPLICA_PIN_SECONDS секунд, пока реплики догоняют её.
+    """
+    cache.set(PIN_KEY.format(user_id=user_id), True,
+              settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned_to_primary(user_id):
+    return cache.get(PIN_KEY.format(user_id=user_id), False)
+
+
+class ReplicaRouter:
+    """
+    Отправляет чтения на реплику, выбранную для текущего запроса
+    через current_replica, а все записи - на основную базу. Кэш в базе
+    читается только с основной: отставшая реплика вернула бы старые
+    версии данных.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == CACHE_APP_LABEL:
+            return DEFAULT_DB_ALIAS
+        return current_replica.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
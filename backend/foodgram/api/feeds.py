@@ -0,0 +1,94 @@
+from heapq import merge
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+
+from recipes.models import FeedEntry, Recipe
+from users.models import Follow
+
+
+def is_fanout_author(author):
+    """
+    Рецепты автора рассылаются в ленты подписчиков при публикации,
+    если подписчиков не больше FEED_FANOUT_LIMIT. Рецепты остальных
+    авторов подмешиваются в ленту при чтении.
+    """
+    return author.followers_count <= settings.FEED_FANOUT_LIMIT
+
+
+def fan_out(recipe):
+    """Добавляет рецепт в ленты всех подписчиков автора."""
+    if not recipe.fanned_out:
+        return
+    user_ids = Follow.objects.filter(
+        following_id=recipe.author_id
+    ).values_list('user_id', flat=True).iterator()
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, recipe_id=recipe.pk,
+                   author_id=recipe.author_id)
+         for user_id in user_ids),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def get_recent_recipes(author_ids):
+    """
+    Пары (автор, id) последних FEED_BACKFILL разосланных рецептов
+    каждого автора одним запросом: коррелированный подзапрос читает
+    рецепты автора по индексу (author, -id).
+    """
+    recent = Recipe.objects.filter(
+        author=OuterRef('author'), fanned_out=True
+    ).order_by('-id').values('id')[:settings.FEED_BACKFILL]
+    return Recipe.objects.filter(
+        author_id__in=author_ids, id__in=Subquery(recent)
+    ).order_by().values_list('author_id', 'id')
+
+
+def add_authors(user_id, author_ids):
+    """
+    Добавляет в ленту новых подписок последние FEED_BACKFILL
+    разосланных рецептов каждого автора.
+    """
+    if not author_ids:
+        return
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, recipe_id=recipe_id, author_id=author_id)
+         for author_id, recipe_id in get_recent_recipes(author_ids)),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def remove_authors(user_id, author_ids):
+    """Убирает из ленты рецепты авторов, от которых пользователь отписался."""
+    if author_ids:
+        FeedEntry.objects.filter(
+            user_id=user_id, author_id__in=author_ids).delete()
+
+
+def get_feed_ids(user, limit, before=None):
+    """
+    Возвращает до limit id рецептов ленты по убыванию, начиная с
+    рецептов старше before. Разосланные рецепты берутся из записей
+    ленты, остальные - из рецептов авторов, на которых подписан
+    пользователь. Оба запроса идут по индексам и читают не больше
+    limit строк, поэтому число запросов не зависит от страницы
+    и числа подписок.
+    """
+    entries = FeedEntry.objects.filter(user=user)
+    pulled = Recipe.objects.filter(
+        fanned_out=False,
+        author_id__in=Follow.objects.filter(user=user).values('following_id')
+    )
+    if before is not None:
+        entries = entries.filter(recipe_id__lt=before)
+        pulled = pulled.filter(id__lt=before)
+    return list(islice(dict.fromkeys(merge(
+        entries.order_by('-recipe_id').values_list(
+            'recipe_id', flat=True)[:limit],
+        pulled.order_by('-id').values_list('id', flat=True)[:limit],
+        reverse=True
+    )), limit))
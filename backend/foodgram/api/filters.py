@@ -1,11 +1,21 @@
 import django_filters
+from django.conf import settings
 
+from api.search import search_ingredients
 from recipes.models import Ingredient
 
 
 class IngredientFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(lookup_expr='istartswith')
+    name = django_filters.CharFilter(method='filter_name')
 
     class Meta:
         model = Ingredient
         fields = ['name']
+
+    def filter_name(self, queryset, name, value):
+        try:
+            limit = int(self.data.get('limit'))
+        except (TypeError, ValueError):
+            limit = settings.INGREDIENT_SEARCH_LIMIT
+        limit = min(max(limit, 1), settings.INGREDIENT_SEARCH_LIMIT)
+        return search_ingredients(queryset, value, limit)
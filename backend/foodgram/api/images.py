@@ -0,0 +1,181 @@
+import base64
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import (InMemoryUploadedFile,
+                                            TemporaryUploadedFile)
+from django.db import connections, transaction
+from PIL import Image
+from rest_framework import serializers
+
+from api.versions import bump_versions
+
+logger = logging.getLogger(__name__)
+
+# Длина порции base64 кратна 4, чтобы каждая порция декодировалась отдельно.
+DECODE_CHUNK = 64 * 1024
+RENDITIONS = {
+    'full': None,
+    'thumbnail': (480, 480),
+}
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_WORKERS,
+    thread_name_prefix='image-renditions'
+)
+
+
+def iter_base64_chunks(data, start):
+    """
+    Декодирует data начиная с позиции start порциями. Переводы строк
+    и пробелы, которыми кодировщики разбивают base64, пропускаются,
+    а остаток порции, не кратный 4, переносится в следующую.
+    """
+    pending = ''
+    for offset in range(start, len(data), DECODE_CHUNK):
+        part = pending + ''.join(data[offset:offset + DECODE_CHUNK].split())
+        cut = len(part) - len(part) % 4
+        pending = part[cut:]
+        yield base64.b64decode(part[:cut], validate=True)
+    if pending:
+        yield base64.b64decode(pending, validate=True)
+
+
+def decode_base64_image(data):
+    """
+    Декодирует изображение из data URI порциями. Как и при обычной
+    загрузке файлов, результат держится в памяти до
+    FILE_UPLOAD_MAX_MEMORY_SIZE байт, а больше - во временном файле,
+    который Pillow и хранилище читают по пути без копирования.
+    Тип проверяется до декодирования, размер - по мере него. Имя
+    файла - хэш содержимого, поэтому одинаковые загрузки получают
+    одно и то же имя.
+    """
+    separator = data.find(';base64,')
+    if separator == -1:
+        raise serializers.ValidationError('Ожидается изображение в base64.')
+    ext = data[len('data:image/'):separator].lower()
+    if ext not in settings.ALLOWED_IMAGE_TYPES:
+        raise serializers.ValidationError(
+            f'Недопустимый тип изображения: {ext}.')
+    content_type = f'image/{ext}'
+    digest = hashlib.sha256()
+    file = io.BytesIO()
+    size = 0
+    try:
+        for chunk in iter_base64_chunks(data, separator + len(';base64,')):
+            size += len(chunk)
+            if size > settings.MAX_IMAGE_SIZE:
+                file.close()
+                raise serializers.ValidationError(
+                    f'Размер изображения превышает '
+                    f'{settings.MAX_IMAGE_SIZE // (1024 * 1024)} МБ.'
+                )
+            if (isinstance(file, io.BytesIO)
+                    and size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE):
+                buffer = file
+                file = TemporaryUploadedFile(
+                    f'upload.{ext}', content_type, 0, None)
+                file.write(buffer.getbuffer())
+                buffer.close()
+            digest.update(chunk)
+            file.write(chunk)
+    except ValueError:
+        file.close()
+        raise serializers.ValidationError('Некорректная строка base64.')
+    name = f'{digest.hexdigest()}.{ext}'
+    file.seek(0)
+    if isinstance(file, TemporaryUploadedFile):
+        file.name = name
+        file.size = size
+        return file
+    return InMemoryUploadedFile(file, None, name, content_type, size, None)
+
+
+def check_image_pixels(image):
+    """
+    Отклоняет изображения больше MAX_IMAGE_PIXELS пикселей: версии
+    строятся из полностью распакованного оригинала.
+    """
+    width, height = image.image.size
+    if width * height > settings.MAX_IMAGE_PIXELS:
+        image.close()
+        raise serializers.ValidationError(
+            f'Изображение больше {settings.MAX_IMAGE_PIXELS} пикселей.')
+    return image
+
+
+def get_rendition_name(name, rendition):
+    path = PurePosixPath(name)
+    return str(path.parent / 'renditions' / f'{path.stem}_{rendition}.webp')
+
+
+def get_rendition_urls(recipe, request):
+    """
+    Адреса WebP-версий изображения рецепта. Пока версии текущего
+    изображения не сгенерированы, вместо них отдаётся оригинал.
+    Готовность берётся из строки рецепта, без обращений к хранилищу.
+    """
+    image = recipe.image
+    if not image:
+        return {}
+    ready = recipe.renditions_image == image.name
+    urls = {}
+    for rendition in RENDITIONS:
+        url = (image.storage.url(get_rendition_name(image.name, rendition))
+               if ready else image.url)
+        urls[rendition] = request.build_absolute_uri(url)
+    return urls
+
+
+def generate_renditions(recipe_model, name):
+    """
+    Создаёт недостающие версии изображения и отмечает их готовность
+    у всех рецептов с этим изображением, в том числе сославшихся на
+    уже загруженный файл.
+    """
+    try:
+        storage = recipe_model._meta.get_field('image').storage
+        missing = {
+            rendition: size for rendition, size in RENDITIONS.items()
+            if not storage.exists(get_rendition_name(name, rendition))
+        }
+        if missing:
+            with storage.open(name) as file:
+                original = Image.open(file)
+                original.load()
+            if original.mode not in ('RGB', 'RGBA'):
+                original = original.convert('RGBA')
+        for rendition, size in missing.items():
+            rendition_name = get_rendition_name(name, rendition)
+            image = original.copy()
+            if size:
+                image.thumbnail(size)
+            buffer = io.BytesIO()
+            image.save(buffer, format='WEBP', quality=80)
+            storage.save(rendition_name, ContentFile(buffer.getvalue()))
+        recipes = recipe_model.objects.filter(
+            image=name).exclude(renditions_image=name)
+        pks = list(recipes.values_list('pk', flat=True))
+        if pks:
+            recipe_model.objects.filter(pk__in=pks).update(
+                renditions_image=name)
+            bump_versions([f'recipe:{pk}' for pk in pks])
+    except Exception:
+        logger.exception('Не удалось создать версии изображения %s', name)
+    finally:
+        connections.close_all()
+
+
+def schedule_renditions(recipe):
+    """Ставит генерацию версий изображения в фоновый пул после коммита."""
+    if recipe.image:
+        name = recipe.image.name
+        transaction.on_commit(
+            lambda: executor.submit(generate_renditions, type(recipe), name)
+        )
@@ -0,0 +1,139 @@
+from threading import Lock, Thread
+
+from django.core.cache import cache
+from django.db import connections
+
+JOURNAL_HEAD_KEY = 'journal:{name}'
+JOURNAL_KEY = 'journal:{name}:{position}'
+# Процесс, отставший от журнала больше чем на сутки, перестраивает индекс.
+JOURNAL_TIMEOUT = 24 * 60 * 60
+JOURNAL_BATCH = 32
+REBUILD = 'rebuild'
+
+
+def get_journal_head(name):
+    """Номер последней записи журнала name, 0 для пустого журнала."""
+    return cache.get(JOURNAL_HEAD_KEY.format(name=name), 0)
+
+
+def append_journal(name, ids=None):
+    """
+    Дописывает в общий журнал name изменённые id, None - изменилось
+    всё. Номер записи выдаёт cache.incr; на бэкендах, где incr не
+    атомарен, занятый номер обнаруживается через cache.add.
+    """
+    head_key = JOURNAL_HEAD_KEY.format(name=name)
+    entry = REBUILD if ids is None else list(ids)
+    while True:
+        try:
+            position = cache.incr(head_key)
+        except ValueError:
+            cache.add(head_key, 0, None)
+            continue
+        if cache.add(JOURNAL_KEY.format(name=name, position=position),
+                     entry, JOURNAL_TIMEOUT):
+            # incr некоторых бэкендов ставит срок хранения по умолчанию.
+            cache.touch(head_key, None)
+            return position
+
+
+def read_journal(name, position):
+    """
+    Записи журнала name после номера position - пары (номер, id),
+    id равны None, если изменилось всё. Возвращает None, если записи
+    потеряны: вытеснены из кэша или журнал начат заново.
+    """
+    head = get_journal_head(name)
+    if head < position:
+        return None
+    entries = []
+    while position < head:
+        last = min(head, position + JOURNAL_BATCH)
+        keys = [JOURNAL_KEY.format(name=name, position=number)
+                for number in range(position + 1, last + 1)]
+        found = cache.get_many(keys)
+        for key in keys:
+            if key not in found:
+                return None
+            position += 1
+            entry = found[key]
+            entries.append((position, None if entry == REBUILD else entry))
+    return entries
+
+
+class JournaledIndex:
+    """
+    Индекс в памяти процесса, который все процессы поддерживают
+    в актуальном состоянии по общему журналу изменённых id. Первый
+    запрос строит индекс целиком, следующие применяют новые записи
+    журнала на месте. После полного изменения или потери журнала индекс
+    перестраивается в фоновом потоке, а запросы до конца перестроения
+    обслуживает прежний индекс.
+
+    Подклассы задают journal и реализуют build (построение по строкам
+    _load_rows), _install (замена данных построенным индексом) и _apply
+    (перечитывание изменённых id); последние два вызываются под _lock.
+    """
+
+    journal = None
+
+    def __init__(self):
+        self._lock = Lock()
+        self._position = None
+        self._rebuild_thread = None
+
+    def _load(self):
+        index = type(self)()
+        index.build(index._load_rows())
+        return index
+
+    def _rebuild(self):
+        try:
+            index = self._load()
+            with self._lock:
+                self._install(index)
+                self._position = index._position
+        finally:
+            connections.close_all()
+
+    def _rebuild_in_background(self):
+        with self._lock:
+            if self._rebuild_thread is not None:
+                return
+            self._rebuild_thread = Thread(
+                target=self._rebuild, name=f'rebuild-{self.journal}',
+                daemon=True)
+            self._rebuild_thread.start()
+
+    def _sync(self):
+        """Строит индекс или применяет к нему новые записи журнала."""
+        if self._position is None:
+            with self._lock:
+                if self._position is None:
+                    index = self._load()
+                    self._install(index)
+                    self._position = index._position
+            return
+        thread = self._rebuild_thread
+        if thread is not None:
+            if thread.is_alive():
+                return
+            self._rebuild_thread = None
+        entries = read_journal(self.journal, self._position)
+        if entries is None or any(ids is None for _, ids in entries):
+            self._rebuild_in_background()
+            return
+        for position, ids in entries:
+            with self._lock:
+                if self._position < position:
+                    self._apply(ids)
+                    self._position = position
+
+    def update(self, ids):
+        """
+        Записывает изменение в журнал. Загруженный индекс применяет
+        его сразу, вместе с ещё не учтёнными записями других процессов.
+        """
+        append_journal(self.journal, ids)
+        if self._position is not None:
+            self._sync()
@@ -0,0 +1,132 @@
+import json
+from pathlib import Path
+
+import django
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import force_authenticate
+
+from api.benchmarks import (SEED_OPTIONS, get_benchmark_user,
+                            get_request_factory, measure)
+from api.views import (IngredientViewSet, RecipeViewSet,
+                       SubscriptionsListAPIView)
+from recipes.management.commands.seed import DEFAULT_TAGS, SEED_PREFIX
+from recipes.models import Recipe
+from users.models import Follow
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный замер основных эндпоинтов API на синтетических '
+        'данных с выводом перцентилей времени ответа и числа запросов в JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок пользователя'
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=30,
+            help='Среднее число рецептов в избранном'
+        )
+        parser.add_argument(
+            '--cart', type=int, default=10,
+            help='Среднее число рецептов в списке покупок'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument(
+            '--cold',
+            action='store_true',
+            help='Очищать кэши перед каждым запросом'
+        )
+        parser.add_argument(
+            '--label',
+            default='',
+            help='Метка прогона, например хэш коммита'
+        )
+        parser.add_argument(
+            '--output',
+            help='Файл для результатов, по умолчанию stdout'
+        )
+
+    def handle(self, *args, **options):
+        user = get_benchmark_user(options, self.stderr)
+        factory = get_request_factory()
+
+        def get(view, path, params=None, **kwargs):
+            def make_request():
+                request = factory.get(path, params)
+                force_authenticate(request, user=user)
+                return request
+            return lambda: measure(
+                lambda request: view(request, **kwargs), make_request,
+                options['repeat'], clear_caches if options['cold'] else None
+            )
+
+        recipe_list = RecipeViewSet.as_view({'get': 'list'})
+        recipe_id = Recipe.objects.filter(
+            author__username__startswith=SEED_PREFIX).latest('id').id
+        author_id = Follow.objects.filter(user=user).values_list(
+            'following_id', flat=True).first()
+        scenarios = {
+            'recipes': get(recipe_list, '/api/recipes/'),
+            'recipes_tags': get(
+                recipe_list, '/api/recipes/',
+                {'tags': [slug for *_, slug in DEFAULT_TAGS[:2]]}),
+            'recipes_author': get(recipe_list, '/api/recipes/',
+                                  {'author': author_id}),
+            'recipes_favorited': get(recipe_list, '/api/recipes/',
+                                     {'is_favorited': 1}),
+            'recipes_in_cart': get(recipe_list, '/api/recipes/',
+                                   {'is_in_shopping_cart': 1}),
+            'recipes_popular': get(recipe_list, '/api/recipes/',
+                                   {'ordering': 'popular'}),
+            'recipes_cursor': get(recipe_list, '/api/recipes/',
+                                  {'pagination': 'cursor'}),
+            'recipe_detail': get(
+                RecipeViewSet.as_view({'get': 'retrieve'}),
+                f'/api/recipes/{recipe_id}/', pk=recipe_id),
+            'feed': get(RecipeViewSet.as_view({'get': 'feed'}),
+                        '/api/recipes/feed/'),
+            'download_shopping_cart': get(
+                RecipeViewSet.as_view({'get': 'download_shopping_cart'}),
+                '/api/recipes/download_shopping_cart/'),
+            'subscriptions': get(
+                SubscriptionsListAPIView.as_view({'get': 'list'}),
+                '/api/users/subscriptions/', {'recipes_limit': 3}),
+            'ingredient_search': get(
+                IngredientViewSet.as_view({'get': 'list'}),
+                '/api/ingredients/', {'name': 'сы'}),
+        }
+        results = {}
+        for name, run in scenarios.items():
+            results[name] = run()
+            self.stderr.write(
+                f'{name}: p50 {results[name]["p50_ms"]} мс, '
+                f'p95 {results[name]["p95_ms"]} мс, '
+                f'запросов {results[name]["queries"]}'
+            )
+        report = json.dumps({
+            'label': options['label'],
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'django': django.get_version(),
+            'scale': {key: options[key] for key in SEED_OPTIONS},
+            'cold': options['cold'],
+            'results': results,
+        }, ensure_ascii=False, indent=2)
+        if options['output']:
+            Path(options['output']).write_text(report, encoding='utf-8')
+        else:
+            self.stdout.write(report)
+
+
+def clear_caches():
+    for cache in caches.all():
+        cache.clear()
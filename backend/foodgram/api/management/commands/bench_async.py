@@ -0,0 +1,267 @@
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+from pathlib import Path
+from urllib.parse import urlencode
+
+import django
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from api.benchmarks import (SEED_OPTIONS, get_benchmark_user, get_host,
+                            percentile)
+from recipes.models import Recipe
+
+MODES = ('wsgi', 'asgi')
+
+
+def add_db_latency(seconds):
+    """
+    Добавляет задержку к каждому запросу к базе, чтобы локальная база
+    вела себя как сетевая.
+    """
+    def wrapper(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def install(connection, **kwargs):
+        if wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(wrapper)
+
+    connection_created.connect(install, weak=False)
+    for alias in connections:
+        install(connections[alias])
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение пропускной способности WSGI с синхронными воркерами и '
+        'ASGI с асинхронными представлениями при большом числе '
+        'одновременных клиентов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument('--follows', type=int, default=20)
+        parser.add_argument('--favorites', type=int, default=30)
+        parser.add_argument('--cart', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=100,
+            help='Число одновременных клиентов'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Число синхронных воркеров WSGI'
+        )
+        parser.add_argument(
+            '--db-latency',
+            type=float,
+            default=0,
+            help='Задержка каждого запроса к базе в миллисекундах'
+        )
+        parser.add_argument(
+            '--mode',
+            choices=MODES,
+            help='Замерить один режим в текущем процессе. Без параметра '
+                 'оба режима запускаются в отдельных процессах, так как '
+                 'маршруты зависят от ASYNC_VIEWS'
+        )
+        parser.add_argument(
+            '--label',
+            default='',
+            help='Метка прогона, например хэш коммита'
+        )
+        parser.add_argument(
+            '--output',
+            help='Файл для результатов, по умолчанию stdout'
+        )
+
+    def handle(self, *args, **options):
+        get_benchmark_user(options, self.stderr)
+        if options['mode']:
+            results = self.run_mode(options)
+            self.stdout.write(json.dumps(results))
+            return
+        results = {mode: self.spawn(mode, options) for mode in MODES}
+        report = json.dumps({
+            'label': options['label'],
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'django': django.get_version(),
+            'scale': {key: options[key] for key in SEED_OPTIONS},
+            'concurrency': options['concurrency'],
+            'workers': options['workers'],
+            'db_latency_ms': options['db_latency'],
+            'results': results,
+            'speedup': round(
+                results['asgi']['rps'] / results['wsgi']['rps'], 2),
+        }, ensure_ascii=False, indent=2)
+        if options['output']:
+            Path(options['output']).write_text(report, encoding='utf-8')
+        else:
+            self.stdout.write(report)
+
+    def spawn(self, mode, options):
+        arguments = [
+            f'--{key.replace("_", "-")}={options[key]}' for key in (
+                *SEED_OPTIONS, 'requests', 'concurrency', 'workers',
+                'db_latency')
+        ]
+        process = subprocess.run(
+            [sys.executable, '-m', 'django', 'bench_async',
+             f'--mode={mode}', *arguments],
+            env={**os.environ, 'ASYNC_VIEWS': str(mode == 'asgi')},
+            cwd=settings.BASE_DIR, stdout=subprocess.PIPE, check=True
+        )
+        results = json.loads(process.stdout)
+        self.stderr.write(
+            f'{mode}: {results["rps"]} запросов/с, '
+            f'p50 {results["p50_ms"]} мс, p99 {results["p99_ms"]} мс, '
+            f'ошибок {results["errors"]}'
+        )
+        return results
+
+    def get_targets(self, options):
+        user = get_benchmark_user(options, self.stderr)
+        recipe_ids = list(Recipe.objects.order_by('-id').values_list(
+            'id', flat=True)[:10])
+        targets = [
+            ('/api/recipes/', {}),
+            ('/api/recipes/', {'page': 2}),
+            ('/api/ingredients/', {'name': 'сы'}),
+            ('/api/users/subscriptions/', {'recipes_limit': 3}),
+            *((f'/api/recipes/{pk}/', {}) for pk in recipe_ids),
+        ]
+        token, _ = Token.objects.get_or_create(user=user)
+        return [(path, urlencode(params)) for path, params in targets], token
+
+    def run_mode(self, options):
+        targets, token = self.get_targets(options)
+        if options['db_latency']:
+            add_db_latency(options['db_latency'] / 1000)
+        if options['mode'] == 'asgi':
+            send = self.get_asgi_client(token)
+        else:
+            send = self.get_wsgi_client(token, options['workers'])
+        return asyncio.run(self.run_clients(
+            send, targets, options['requests'], options['concurrency']))
+
+    def get_asgi_client(self, token):
+        application = get_asgi_application()
+        host = get_host()
+        headers = [
+            (b'host', host.encode()),
+            (b'authorization', f'Token {token.key}'.encode()),
+        ]
+
+        async def send(path, query):
+            messages = [{'type': 'http.request', 'body': b''}]
+            response = {}
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                return {'type': 'http.disconnect'}
+
+            async def send_message(message):
+                if message['type'] == 'http.response.start':
+                    response['status'] = message['status']
+
+            await application({
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'GET',
+                'scheme': 'http',
+                'path': path,
+                'query_string': query.encode(),
+                'root_path': '',
+                'headers': headers,
+                'client': ('127.0.0.1', 0),
+                'server': (host, 80),
+            }, receive, send_message)
+            return response['status']
+
+        return send
+
+    def get_wsgi_client(self, token, workers):
+        application = get_wsgi_application()
+        executor = ThreadPoolExecutor(max_workers=workers)
+        host = get_host()
+
+        def call(path, query):
+            status = []
+            result = application({
+                'REQUEST_METHOD': 'GET',
+                'SCRIPT_NAME': '',
+                'PATH_INFO': path,
+                'QUERY_STRING': query,
+                'SERVER_NAME': host,
+                'SERVER_PORT': '80',
+                'HTTP_HOST': host,
+                'HTTP_AUTHORIZATION': f'Token {token.key}',
+                'wsgi.input': io.BytesIO(),
+                'wsgi.url_scheme': 'http',
+            }, lambda code, headers: status.append(int(code.split()[0])))
+            try:
+                for _ in result:
+                    pass
+            finally:
+                result.close()
+            return status[0]
+
+        async def send(path, query):
+            # Запрос ждёт свободного воркера, как в очереди gunicorn.
+            return await asyncio.get_running_loop().run_in_executor(
+                executor, call, path, query)
+
+        return send
+
+    async def run_clients(self, send, targets, total, concurrency):
+        for path, query in targets:
+            await send(path, query)
+        requests = islice(cycle(targets), total)
+        timings = []
+        errors = 0
+
+        async def client():
+            nonlocal errors
+            for path, query in requests:
+                started = time.perf_counter()
+                status = await send(path, query)
+                timings.append((time.perf_counter() - started) * 1000)
+                errors += status >= 400
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        timings.sort()
+        return {
+            'requests': len(timings),
+            'errors': errors,
+            'seconds': round(elapsed, 3),
+            'rps': round(len(timings) / elapsed, 1),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'max_ms': round(timings[-1], 3),
+        }
@@ -0,0 +1,177 @@
+import random
+import statistics
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count, F, FloatField, Q
+from django.db.models.functions import Cast
+
+from api.benchmarks import get_benchmark_user, percentile
+from api.cookable import CookableIndex
+from recipes.models import Ingredient, Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер подбора рецептов по имеющимся ингредиентам: индекс '
+        'в памяти против запроса с группировкой в СУБД'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--follows', type=int, default=20)
+        parser.add_argument('--favorites', type=int, default=30)
+        parser.add_argument('--cart', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--synthetic',
+            type=int,
+            default=0,
+            help=(
+                'Построить индекс по указанному числу случайных рецептов '
+                'без обращения к БД'
+            )
+        )
+        parser.add_argument(
+            '--ingredients',
+            type=int,
+            default=2000,
+            help='Количество ингредиентов в режиме --synthetic'
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=200,
+            help='Количество запросов со случайным набором ингредиентов'
+        )
+        parser.add_argument(
+            '--pantry',
+            type=int,
+            default=10,
+            help='Количество ингредиентов в запросе'
+        )
+        parser.add_argument(
+            '--min-coverage',
+            type=float,
+            default=0
+        )
+        parser.add_argument(
+            '--memory',
+            action='store_true',
+            help='Дополнительно построить индекс под tracemalloc'
+        )
+        parser.add_argument(
+            '--no-sql',
+            action='store_true',
+            help='Не замерять запрос к СУБД: на больших объёмах он медленный'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        if options['synthetic']:
+            ingredient_ids = list(range(1, options['ingredients'] + 1))
+            build = self.synthetic_build(options, ingredient_ids)
+            self.stdout.write(f'Рецептов: {options["synthetic"]}, '
+                              f'синтетический индекс')
+        else:
+            get_benchmark_user(options, self.stderr)
+            ingredient_ids = list(
+                Ingredient.objects.values_list('id', flat=True))
+            build = self.database_build
+            self.stdout.write(f'Рецептов: {Recipe.objects.count()}, '
+                              f'СУБД: {connection.vendor}')
+
+        started = time.perf_counter()
+        index = build()
+        self.stdout.write(f'Индекс в памяти: построение '
+                          f'{time.perf_counter() - started:.1f} с')
+        if options['memory']:
+            del index
+            tracemalloc.start()
+            index = build()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.stdout.write(
+                f'Индекс в памяти: занимает {current / 2 ** 20:.0f} МБ, '
+                f'пик при построении {peak / 2 ** 20:.0f} МБ'
+            )
+
+        pantries = [
+            rng.sample(ingredient_ids,
+                       min(options['pantry'], len(ingredient_ids)))
+            for _ in range(options['queries'])
+        ]
+        limit = settings.COOKABLE_LIMIT
+        min_coverage = options['min_coverage']
+        strategies = {
+            'memory_index': lambda pantry: index.search(
+                pantry, limit, min_coverage),
+        }
+        if not options['synthetic'] and not options['no_sql']:
+            strategies['sql'] = lambda pantry: self.sql_search(
+                pantry, limit, min_coverage)
+        for title, search in strategies.items():
+            search(pantries[0])
+            timings = []
+            found = []
+            for pantry in pantries:
+                started = time.perf_counter()
+                found.append(len(search(pantry)))
+                timings.append((time.perf_counter() - started) * 1000)
+            self.report(title, timings, f'найдено в среднем '
+                                        f'{statistics.mean(found):.0f}')
+
+        if not options['synthetic']:
+            recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+            timings = []
+            for _ in range(options['queries']):
+                recipe_id = rng.choice(recipe_ids)
+                started = time.perf_counter()
+                index.update([recipe_id])
+                timings.append((time.perf_counter() - started) * 1000)
+            self.report('update', timings, 'обновлений по одному рецепту')
+
+    def report(self, title, timings, extra):
+        timings.sort()
+        self.stdout.write(
+            f'{title}: замеров {len(timings)}, '
+            f'среднее {statistics.mean(timings):.3f} мс, '
+            f'p50 {percentile(timings, 50):.3f} мс, '
+            f'p95 {percentile(timings, 95):.3f} мс, '
+            f'макс {timings[-1]:.3f} мс, {extra}'
+        )
+
+    def database_build(self):
+        index = CookableIndex()
+        index.search([], 1)
+        return index
+
+    def synthetic_build(self, options, ingredient_ids):
+        """Случайный состав рецептов того же размера, что в команде seed."""
+        def build():
+            rng = random.Random(options['seed'])
+            index = CookableIndex()
+            index.build(
+                (recipe_id, ingredient_id)
+                for recipe_id in range(1, options['synthetic'] + 1)
+                for ingredient_id in sorted(rng.sample(
+                    ingredient_ids, max(1, min(25, round(rng.gauss(9, 3))))))
+            )
+            return index
+        return build
+
+    def sql_search(self, pantry, limit, min_coverage):
+        """Доля совпавших строк состава с группировкой в СУБД."""
+        return list(Recipe.objects.annotate(
+            matched=Count('recipe_ingredients', filter=Q(
+                recipe_ingredients__ingredient_id__in=pantry)),
+            total=Count('recipe_ingredients')
+        ).filter(matched__gt=0).annotate(
+            coverage=Cast('matched', FloatField()) / F('total')
+        ).filter(coverage__gte=min_coverage).order_by(
+            '-coverage', '-matched', '-id'
+        ).values_list('coverage', 'matched', 'id')[:limit])
@@ -0,0 +1,115 @@
+import base64
+import io
+import os
+import resource
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from PIL import Image
+from rest_framework.test import force_authenticate
+
+from api.benchmarks import get_request_factory
+from api.views import RecipeViewSet
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+BENCH_USERNAME = 'bench_images'
+
+
+class Command(BaseCommand):
+    help = (
+        'Пиковое потребление памяти при создании и изменении рецепта '
+        'с большим изображением'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=float,
+            nargs='+',
+            default=[1, 4, 9],
+            help='Размеры изображений в мегабайтах'
+        )
+
+    def handle(self, *args, **options):
+        factory = get_request_factory()
+        create = RecipeViewSet.as_view({'post': 'create'})
+        update = RecipeViewSet.as_view({'patch': 'partial_update'})
+        saved_files = []
+        try:
+            self.run(options['sizes'], factory, create, update, saved_files)
+        finally:
+            storage = Recipe._meta.get_field('image').storage
+            for name in saved_files:
+                storage.delete(name)
+
+    def run(self, sizes, factory, create, update, saved_files):
+        with transaction.atomic():
+            author, tag, ingredient = self.get_fixtures()
+            for size in sizes:
+                payload = {
+                    'ingredients': [{'id': ingredient.id, 'amount': 1}],
+                    'tags': [tag.id],
+                    'image': self.make_image(size),
+                    'name': 'Замер памяти',
+                    'text': 'Синтетический рецепт',
+                    'cooking_time': 10,
+                }
+                request = factory.post('/api/recipes/', payload,
+                                       format='json')
+                force_authenticate(request, author)
+                self.measure(f'{size} МБ, создание', create, request)
+                recipe = Recipe.objects.filter(author=author).latest('id')
+                saved_files.append(recipe.image.name)
+
+                payload['image'] = self.make_image(size)
+                request = factory.patch(f'/api/recipes/{recipe.pk}/',
+                                        payload, format='json')
+                force_authenticate(request, author)
+                self.measure(f'{size} МБ, изменение', update, request,
+                             pk=recipe.pk)
+                saved_files.append(Recipe.objects.get(pk=recipe.pk).image.name)
+            transaction.set_rollback(True)
+
+    def get_fixtures(self):
+        author, _ = User.objects.get_or_create(
+            username=BENCH_USERNAME,
+            defaults={'email': f'{BENCH_USERNAME}@example.com'}
+        )
+        tag, _ = Tag.objects.get_or_create(
+            slug=BENCH_USERNAME,
+            defaults={'name': BENCH_USERNAME, 'color': '#BE7C4D'}
+        )
+        ingredient, _ = Ingredient.objects.get_or_create(
+            name=BENCH_USERNAME, measurement_unit='г')
+        return author, tag, ingredient
+
+    def make_image(self, megabytes):
+        """PNG из шума: почти не сжимается, поэтому размер предсказуем."""
+        side = int((megabytes * 1024 * 1024 / 3) ** 0.5)
+        buffer = io.BytesIO()
+        Image.frombytes('RGB', (side, side), os.urandom(side * side * 3)
+                        ).save(buffer, format='PNG', compress_level=0)
+        return ('data:image/png;base64,'
+                + base64.b64encode(buffer.getvalue()).decode())
+
+    def measure(self, title, view, request, **kwargs):
+        body_size = int(request.META['CONTENT_LENGTH'])
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        tracemalloc.start()
+        started = time.perf_counter()
+        response = view(request, **kwargs)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.stdout.write(
+            f'{title}: статус {response.status_code}, '
+            f'тело {body_size / 2 ** 20:.1f} МБ, '
+            f'пик Python-аллокаций {peak / 2 ** 20:.1f} МБ, '
+            f'рост пикового RSS {(rss_after - rss_before) / 1024:.1f} МБ, '
+            f'{elapsed * 1000:.0f} мс'
+        )
+        return response
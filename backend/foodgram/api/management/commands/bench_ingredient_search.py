@@ -0,0 +1,54 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.search import search_ingredients
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер поиска ингредиентов по всем префиксам названий '
+        'из загруженного справочника'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-prefix',
+            type=int,
+            default=3,
+            help='Максимальная длина префикса, имитирующая ввод с клавиатуры'
+        )
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            raise CommandError(
+                'Справочник пуст, сначала выполните import_csv')
+        prefixes = sorted({
+            name[:length].lower() for name in names
+            for length in range(1, options['max_prefix'] + 1)
+        })
+        strategies = {
+            'istartswith': lambda value: Ingredient.objects.filter(
+                name__istartswith=value),
+            'search_ingredients': lambda value: search_ingredients(
+                Ingredient.objects.all(), value,
+                settings.INGREDIENT_SEARCH_LIMIT),
+        }
+        for title, search in strategies.items():
+            list(search(prefixes[0]))
+            timings = []
+            for prefix in prefixes:
+                started = time.perf_counter()
+                list(search(prefix))
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f'{title}: запросов {len(timings)}, '
+                f'среднее {statistics.mean(timings):.3f} мс, '
+                f'p95 {timings[int(len(timings) * 0.95)]:.3f} мс, '
+                f'макс {timings[-1]:.3f} мс'
+            )
@@ -0,0 +1,101 @@
+import statistics
+import time
+from base64 import b64encode
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.benchmarks import get_request_factory
+from api.views import RecipeViewSet
+from recipes.models import Recipe
+from users.models import User
+
+BENCH_USERNAME = 'bench_pagination'
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение времени выдачи страниц ленты рецептов при постраничной '
+        'и курсорной пагинации на разной глубине'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=1_000_000,
+            help='Сколько рецептов должно быть в базе перед замером'
+        )
+        parser.add_argument(
+            '--depths',
+            type=int,
+            nargs='+',
+            default=[1, 100, 1_000, 10_000, 100_000],
+            help='Номера страниц, на которых выполняется замер'
+        )
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument(
+            '--yes',
+            action='store_true',
+            help='Разрешить создание недостающих рецептов в базе default'
+        )
+
+    def handle(self, *args, **options):
+        missing = options['recipes'] - Recipe.objects.count()
+        if missing > 0 and not options['yes']:
+            raise CommandError(
+                f'Для замера не хватает {missing} рецептов. Команда создаст '
+                f'их в базе default от пользователя {BENCH_USERNAME}; '
+                f'запустите её с --yes только на тестовой базе.'
+            )
+        self.fill(options['recipes'])
+        view = RecipeViewSet.as_view({'get': 'list'})
+        factory = get_request_factory()
+        limit = options['limit']
+        ids = Recipe.objects.order_by('-id').values_list('id', flat=True)
+        for depth in options['depths']:
+            offset = (depth - 1) * limit
+            if offset >= options['recipes']:
+                continue
+            params = {
+                'page-number': {'page': depth, 'limit': limit},
+                'cursor': {'cursor': self.encode_cursor(ids[offset] + 1),
+                           'limit': limit},
+            }
+            for title, query in params.items():
+                timings = []
+                for _ in range(options['repeat']):
+                    request = factory.get('/api/recipes/', query)
+                    started = time.perf_counter()
+                    view(request).render()
+                    timings.append((time.perf_counter() - started) * 1000)
+                self.stdout.write(
+                    f'страница {depth}, {title}: '
+                    f'медиана {statistics.median(timings):.2f} мс'
+                )
+
+    def encode_cursor(self, position):
+        return b64encode(urlencode({'p': position}).encode()).decode()
+
+    def fill(self, total):
+        missing = total - Recipe.objects.count()
+        if missing <= 0:
+            return
+        author, _ = User.objects.get_or_create(
+            username=BENCH_USERNAME,
+            defaults={'email': f'{BENCH_USERNAME}@example.com'}
+        )
+        chunk_size = 10_000
+        self.stdout.write(f'Создание {missing} рецептов...')
+        with transaction.atomic():
+            for start in range(0, missing, chunk_size):
+                Recipe.objects.bulk_create(
+                    [Recipe(author=author, name=f'Рецепт {start + index}',
+                            text='Синтетический рецепт',
+                            image='recipes/images/temp.jpeg',
+                            cooking_time=10)
+                     for index in range(min(chunk_size, missing - start))],
+                    batch_size=chunk_size
+                )
@@ -0,0 +1,116 @@
+import random
+import statistics
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+from api.benchmarks import get_benchmark_user, percentile
+from api.search import RecipeSearchIndex, search_recipes
+from api.stemmer import WORD_RE
+from recipes.models import Ingredient, Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер полнотекстового поиска рецептов на синтетических данных: '
+        'поиск СУБД, индекс в памяти и наивный icontains'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--follows', type=int, default=20)
+        parser.add_argument('--favorites', type=int, default=30)
+        parser.add_argument('--cart', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=200,
+            help='Количество поисковых запросов из слов названий ингредиентов'
+        )
+        parser.add_argument(
+            '--memory',
+            action='store_true',
+            help='Дополнительно построить индекс под tracemalloc'
+        )
+        parser.add_argument(
+            '--no-icontains',
+            action='store_true',
+            help='Не замерять icontains: на больших объёмах он очень медленный'
+        )
+
+    def handle(self, *args, **options):
+        get_benchmark_user(options, self.stderr)
+        self.stdout.write(
+            f'Рецептов: {Recipe.objects.count()}, СУБД: {connection.vendor}')
+        queries = self.get_queries(options)
+
+        index = RecipeSearchIndex()
+        started = time.perf_counter()
+        index.search(queries[0], 1)
+        self.stdout.write(f'Индекс в памяти: построение '
+                          f'{time.perf_counter() - started:.1f} с')
+        if options['memory']:
+            tracemalloc.start()
+            traced = RecipeSearchIndex()
+            traced.search(queries[0], 1)
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.stdout.write(
+                f'Индекс в памяти: занимает {current / 2 ** 20:.0f} МБ, '
+                f'пик при построении {peak / 2 ** 20:.0f} МБ'
+            )
+
+        limit = settings.RECIPE_SEARCH_LIMIT
+        strategies = {
+            'memory_index': lambda query: index.search(query, limit),
+        }
+        if connection.vendor == 'postgresql':
+            strategies['search_vector'] = lambda query: search_recipes(
+                query, limit)
+        if not options['no_icontains']:
+            strategies['icontains'] = self.icontains
+        for title, search in strategies.items():
+            search(queries[0])
+            timings = []
+            found = []
+            for query in queries:
+                started = time.perf_counter()
+                found.append(len(search(query)))
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f'{title}: запросов {len(timings)}, '
+                f'среднее {statistics.mean(timings):.3f} мс, '
+                f'p50 {percentile(timings, 50):.3f} мс, '
+                f'p95 {percentile(timings, 95):.3f} мс, '
+                f'макс {timings[-1]:.3f} мс, '
+                f'найдено в среднем {statistics.mean(found):.0f}'
+            )
+
+    def get_queries(self, options):
+        """Запросы из одного-двух слов названий ингредиентов."""
+        words = sorted({
+            word for name in Ingredient.objects.values_list('name', flat=True)
+            for word in WORD_RE.findall(name.lower()) if len(word) > 3
+        })
+        rng = random.Random(options['seed'])
+        return [' '.join(rng.sample(words, rng.choice((1, 1, 2))))
+                for _ in range(options['queries'])]
+
+    def icontains(self, query):
+        """
+        Наивный поиск: каждое слово в названии, описании или ингредиентах.
+        """
+        recipes = Recipe.objects.all()
+        for word in query.split():
+            recipes = recipes.filter(
+                Q(name__icontains=word) | Q(text__icontains=word)
+                | Q(ingredients__name__icontains=word))
+        return list(recipes.distinct().values_list(
+            'id', flat=True)[:settings.RECIPE_SEARCH_LIMIT])
@@ -0,0 +1,92 @@
+import random
+import resource
+import time
+from itertools import accumulate
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.recommendations import CoOccurrence
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер построения похожих рецептов на синтетическом избранном: '
+        'время и пиковая память процесса, без записи в БД'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500000)
+        parser.add_argument('--recipes', type=int, default=200000)
+        parser.add_argument(
+            '--per-user',
+            type=int,
+            default=20,
+            help='Среднее число рецептов у пользователя'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--sample',
+            type=int,
+            default=0,
+            help=(
+                'Считать соседей только для стольких рецептов и оценить '
+                'полное время пропорционально'
+            )
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'Пользователей: {options["users"]}, '
+            f'рецептов: {options["recipes"]}, '
+            f'строк избранного: ~{options["users"] * options["per_user"]}'
+        )
+        started = time.perf_counter()
+        co_occurrence = CoOccurrence(
+            self.interactions(options),
+            settings.RECOMMENDATIONS_MAX_USER_ITEMS
+        )
+        self.stdout.write(
+            f'Пар: {co_occurrence.pairs_count}, '
+            f'массивы построены за {time.perf_counter() - started:.1f} с, '
+            f'пик памяти {self.peak_memory():.0f} МБ'
+        )
+
+        recipe_ids = list(co_occurrence.recipe_ids())
+        sample = recipe_ids
+        if options['sample']:
+            sample = random.Random(options['seed']).sample(
+                recipe_ids, min(options['sample'], len(recipe_ids)))
+        started = time.perf_counter()
+        neighbours = sum(
+            len(co_occurrence.neighbours(
+                recipe_id, settings.RECOMMENDATIONS_NEIGHBOURS))
+            for recipe_id in sample
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Соседи: рецептов {len(sample)}, строк {neighbours}, '
+            f'{elapsed:.1f} с, оценка для всех {len(recipe_ids)} рецептов '
+            f'{elapsed * len(recipe_ids) / len(sample):.0f} с, '
+            f'пик памяти {self.peak_memory():.0f} МБ'
+        )
+
+    def interactions(self, options):
+        """
+        Пары (пользователь, рецепт) по возрастанию пользователя.
+        Популярность рецептов убывает по закону Ципфа, пары
+        генерируются на лету и в памяти не накапливаются.
+        """
+        rng = random.Random(options['seed'])
+        recipes = range(1, options['recipes'] + 1)
+        cum_weights = list(accumulate(1 / recipe_id for recipe_id in recipes))
+        for user_id in range(1, options['users'] + 1):
+            count = rng.randint(1, 2 * options['per_user'] - 1)
+            for recipe_id in sorted(set(rng.choices(
+                    recipes, cum_weights=cum_weights, k=count))):
+                yield user_id, recipe_id
+
+    @staticmethod
+    def peak_memory():
+        """Пиковый размер процесса в МБ; в Linux ru_maxrss - в КБ."""
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
@@ -0,0 +1,67 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.recommendations import (CoOccurrence, build_similar_recipes,
+                                 load_interactions)
+
+
+class Command(BaseCommand):
+    help = (
+        'Построение таблицы похожих рецептов по совместной встречаемости '
+        'в избранном и списках покупок'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=10000,
+            help='Количество строк избранного и покупок в одном чтении из БД'
+        )
+        parser.add_argument(
+            '--neighbours',
+            type=int,
+            default=settings.RECOMMENDATIONS_NEIGHBOURS,
+            help='Количество похожих рецептов на рецепт'
+        )
+        parser.add_argument(
+            '--min-count',
+            type=int,
+            default=1,
+            help='Минимальное число общих пользователей у похожих рецептов'
+        )
+        parser.add_argument(
+            '--max-user-items',
+            type=int,
+            default=settings.RECOMMENDATIONS_MAX_USER_ITEMS,
+            help='Сколько самых новых рецептов пользователя учитывать'
+        )
+
+    def handle(self, *args, **options):
+        for option in ('chunk_size', 'neighbours', 'min_count',
+                       'max_user_items'):
+            if options[option] < 1:
+                raise CommandError(
+                    f'--{option.replace("_", "-")} должен быть положительным')
+        started = time.perf_counter()
+        co_occurrence = CoOccurrence(
+            load_interactions(options['chunk_size']),
+            options['max_user_items']
+        )
+        self.stdout.write(
+            f'Пар пользователь-рецепт: {co_occurrence.pairs_count}, '
+            f'пользователей: {co_occurrence.users_count}, '
+            f'чтение {time.perf_counter() - started:.1f} с'
+        )
+        started = time.perf_counter()
+        created = build_similar_recipes(
+            co_occurrence, options['neighbours'], options['min_count'],
+            settings.RECOMMENDATIONS_BATCH_SIZE
+        )
+        self.stdout.write(
+            f'Похожих рецептов: {created}, '
+            f'построение {time.perf_counter() - started:.1f} с'
+        )
+        self.stdout.write(self.style.SUCCESS('Рекомендации построены'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from api.images import generate_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Создание WebP-версий изображений рецептов, для которых '
+        'они ещё не отмечены'
+    )
+
+    def handle(self, *args, **options):
+        names = list(Recipe.objects.exclude(
+            renditions_image=F('image')
+        ).exclude(image='').order_by().values_list(
+            'image', flat=True).distinct())
+        for number, name in enumerate(names, 1):
+            generate_renditions(Recipe, name)
+            self.stdout.write(f'Изображения: {number}/{len(names)}')
+        self.stdout.write(self.style.SUCCESS('Версии изображений созданы'))
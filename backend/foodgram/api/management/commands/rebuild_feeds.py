@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.feeds import add_entries, get_recent_recipes
+from recipes.models import FeedEntry, Recipe
+from users.models import Follow, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Построение лент подписок заново по текущим подпискам '
+        'и числу подписчиков авторов'
+    )
+
+    def handle(self, *args, **options):
+        limit = settings.FEED_FANOUT_LIMIT
+        with transaction.atomic():
+            FeedEntry.objects.all().delete()
+            pulled = Recipe.objects.filter(
+                author__followers_count__gt=limit
+            ).update(fanned_out=False)
+            Recipe.objects.filter(
+                author__followers_count__lte=limit
+            ).update(fanned_out=True)
+            # Рецепты автора читаются один раз и рассылаются всем его
+            # подписчикам, как при публикации.
+            authors = User.objects.filter(
+                followers_count__gt=0, followers_count__lte=limit
+            ).values_list('id', flat=True)
+            for author_id in authors.iterator():
+                recipe_ids = [recipe_id for _, recipe_id
+                              in get_recent_recipes([author_id])]
+                if recipe_ids:
+                    add_entries(
+                        Follow.objects.filter(following_id=author_id)
+                        .values_list('user_id', flat=True),
+                        author_id, recipe_ids
+                    )
+        self.stdout.write(
+            f'Записей в лентах: {FeedEntry.objects.count()}, '
+            f'рецептов без рассылки: {pulled}'
+        )
+        self.stdout.write(self.style.SUCCESS('Ленты построены'))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max, Min
+
+from api.cookable import COOKABLE_JOURNAL
+from api.journal import append_journal
+from api.search import SEARCH_JOURNAL, SEARCH_VECTOR_SQL
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Полная переиндексация рецептов для полнотекстового поиска '
+        'и подбора по ингредиентам'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=10000,
+            help='Количество рецептов в одном UPDATE'
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size должен быть положительным')
+        # Процессы перестраивают индексы в памяти в фоновом потоке.
+        append_journal(COOKABLE_JOURNAL)
+        if connection.vendor != 'postgresql':
+            append_journal(SEARCH_JOURNAL)
+            self.stdout.write(self.style.SUCCESS('Индекс сброшен'))
+            return
+        bounds = Recipe.objects.aggregate(first=Min('id'), last=Max('id'))
+        if bounds['first'] is None:
+            return
+        for start in range(bounds['first'], bounds['last'] + 1,
+                           options['chunk_size']):
+            end = start + options['chunk_size'] - 1
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'UPDATE recipes_recipe '
+                    f'SET search_vector = {SEARCH_VECTOR_SQL} '
+                    f'WHERE id BETWEEN %s AND %s',
+                    [start, end]
+                )
+            self.stdout.write(
+                f'Рецепты: {min(end, bounds["last"])}/{bounds["last"]}')
+        self.stdout.write(self.style.SUCCESS('Рецепты переиндексированы'))
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.permissions import SAFE_METHODS
+
+from api.db_router import pin_to_primary
+from api.profiling import RequestProfile, current_profile, install_profiler
+from api.threads import in_thread
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Представление выполнило больше запросов, чем разрешено."""
+
+
+class QueryProfilingMiddleware:
+    """
+    Считает запросы к базе, время SQL и сериализации и размер ответа
+    для каждого представления и отдаёт их в заголовке Server-Timing.
+    Время сериализации считают сериализаторы с ProfiledSerializerMixin.
+    Включается настройкой QUERY_PROFILING. При превышении бюджета
+    запросов из QUERY_BUDGETS пишет предупреждение, а при
+    QUERY_BUDGET_STRICT выбрасывает QueryBudgetExceeded.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.QUERY_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        # Новые соединения получают обёртку при подключении,
+        # уже открытые соединения потока - здесь.
+        for connection in connections.all():
+            install_profiler(connection)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        self.report(request, response, profile,
+                    time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        # Потоки, в которых асинхронные представления ходят в базу,
+        # получают копию контекста корутины вместе с профилем.
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        self.report(request, response, profile,
+                    time.perf_counter() - started)
+        return response
+
+    def report(self, request, response, profile, total_time):
+        view_name = (request.resolver_match.view_name
+                     if request.resolver_match else request.path)
+        size = None if response.streaming else len(response.content)
+        repeated = profile.get_repeated_queries()
+        response['Server-Timing'] = self.get_server_timing(
+            profile, total_time, size, repeated)
+        logger.debug(
+            '%s: %d запросов, SQL %.1f мс, сериализация %.1f мс, '
+            'всего %.1f мс, ответ %s байт', view_name, len(profile.queries),
+            profile.db_time * 1000, profile.serializer_time * 1000,
+            total_time * 1000, size
+        )
+        for sql, count in repeated.items():
+            logger.warning('%s: возможный N+1, запрос выполнен %d раз: %s',
+                           view_name, count, sql)
+        self.check_budget(view_name, len(profile.queries))
+
+    def get_server_timing(self, profile, total_time, size, repeated):
+        metrics = [
+            f'db;dur={profile.db_time * 1000:.1f};'
+            f'desc="{len(profile.queries)} queries"',
+            f'serialize;dur={profile.serializer_time * 1000:.1f}',
+            f'total;dur={total_time * 1000:.1f}',
+        ]
+        if profile.cache_queries:
+            metrics.append(
+                f'dbcache;dur={profile.cache_time * 1000:.1f};'
+                f'desc="{len(profile.cache_queries)} queries"')
+        if size is not None:
+            metrics.append(f'size;desc="{size} bytes"')
+        if repeated:
+            metrics.append(f'nplusone;desc="{len(repeated)} patterns"')
+        return ', '.join(metrics)
+
+    def check_budget(self, view_name, count):
+        budget = settings.QUERY_BUDGETS.get(
+            view_name, settings.QUERY_BUDGET_DEFAULT)
+        if budget is None or count <= budget:
+            return
+        message = (f'{view_name}: выполнено {count} запросов '
+                   f'при бюджете {budget}')
+        if settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+class PrimaryPinMiddleware:
+    """
+    Закрепляет за основной базой пользователя, который только что
+    успешно выполнил изменяющий запрос, чтобы он сразу видел свои
+    изменения, даже если реплики отстают. Закрепление хранится в общем
+    кэше, поэтому действует во всех воркерах: с репликами настройки
+    не допускают LocMemCache.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if self.is_write(request, response):
+            self.pin(request)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if self.is_write(request, response):
+            # Ленивый request.user и кэш могут обращаться к базе.
+            await in_thread(self.pin)(request)
+        return response
+
+    def is_write(self, request, response):
+        return (request.method not in SAFE_METHODS
+                and response.status_code < 400)
+
+    def pin(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            pin_to_primary(user.id)
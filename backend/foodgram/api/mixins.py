@@ -0,0 +1,104 @@
+import hashlib
+
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+from rest_framework.permissions import SAFE_METHODS
+
+from api.db_router import choose_replica, current_replica, is_pinned_to_primary
+from api.versions import get_versions
+
+
+class ConditionalGetMixin:
+    """
+    Поддержка условных GET-запросов для list и retrieve.
+    ETag и Last-Modified строятся из версий ресурсов, которые
+    возвращает get_version_names, до выполнения запроса к базе,
+    поэтому ответ 304 стоит только чтения версий из кэша.
+    """
+    list_version_names = ()
+    detail_version_names = ()
+    vary_by_user = False
+
+    def get_version_names(self):
+        if self.action == 'retrieve':
+            # /recipes/012/ и /recipes/12/ - один рецепт и одна версия.
+            kwargs = {key: int(value) if str(value).isdigit() else value
+                      for key, value in self.kwargs.items()}
+            names = [name.format(**kwargs)
+                     for name in self.detail_version_names]
+        else:
+            names = list(self.list_version_names)
+        if self.vary_by_user and self.request.user.is_authenticated:
+            names.append(f'user_flags:{self.request.user.id}')
+        return names
+
+    def get_validators(self, request):
+        """ETag и Last-Modified по версиям ресурсов представления."""
+        versions = get_versions(self.get_version_names())
+        digest = hashlib.md5(request.get_full_path().encode())
+        if self.vary_by_user:
+            digest.update(str(request.user.id).encode())
+        for name, (token, _) in sorted(versions.items()):
+            digest.update(f'{name}={token};'.encode())
+        last_modified = int(max(
+            (modified for _, modified in versions.values()), default=0))
+        return quote_etag(digest.hexdigest()), last_modified
+
+    def patch_validators(self, response, etag, last_modified):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        if self.vary_by_user:
+            patch_vary_headers(response, ('Authorization',))
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(response, no_cache=True)
+        return response
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        return self.patch_validators(response, etag, last_modified)
+
+    def list(self, request, *args, **kwargs):
+        if not self.list_version_names:
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.detail_version_names:
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs)
+
+
+class ReplicaReadMixin:
+    """
+    Выполняет безопасные запросы представления на реплике, если
+    пользователь недавно ничего не изменял.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method not in SAFE_METHODS:
+            return
+        if (request.user.is_authenticated
+                and is_pinned_to_primary(request.user.id)):
+            return
+        # Предыдущее значение восстанавливается через set, а не по токену:
+        # асинхронные представления вызывают initial и finalize_response
+        # в разных потоках с разными копиями контекста.
+        self._previous_replica = current_replica.get()
+        current_replica.set(choose_replica())
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if hasattr(self, '_previous_replica'):
+            current_replica.set(self._previous_replica)
+            del self._previous_replica
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -1,6 +1,113 @@
-from rest_framework.pagination import PageNumberPagination
+from collections import OrderedDict
+
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import (BasePagination, CursorPagination,
+                                       PageNumberPagination,
+                                       _positive_int)
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from api.feeds import get_feed_ids
 
 
 class CustomPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Пагинация по ключу -id: без COUNT(*) и OFFSET, время выдачи
+    не зависит от глубины страницы.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = '-id'
+    invalid_ordering_message = (
+        'Курсорная пагинация доступна только для порядка по новизне.')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Курсор заменил бы порядок выборки на -id, а по изменяемому
+        # числу добавлений в избранное страницы пропускали бы рецепты.
+        if tuple(queryset.query.order_by) not in ((), (self.ordering,)):
+            raise ValidationError({'ordering': self.invalid_ordering_message})
+        return super().paginate_queryset(queryset, request, view)
+
+
+class RecipePagination(CustomPagination):
+    """
+    Постраничная пагинация ленты рецептов с переключением на курсорную
+    по параметру pagination=cursor или при наличии параметра cursor.
+    """
+    cursor_paginator = None
+
+    def use_cursor(self, request):
+        return (request.query_params.get('pagination') == 'cursor'
+                or RecipeCursorPagination.cursor_query_param
+                in request.query_params)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.cursor_paginator = RecipeCursorPagination()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class FeedPagination(BasePagination):
+    """
+    Пагинация ленты подписок по ключу: параметр before - id последнего
+    рецепта предыдущей страницы. Страница собирается из записей ленты
+    и рецептов авторов, не рассылаемых при публикации.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    before_query_param = 'before'
+    invalid_before_message = 'Неверное значение before.'
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_before(self, request):
+        before = request.query_params.get(self.before_query_param)
+        if before is None:
+            return None
+        try:
+            return _positive_int(before, strict=True)
+        except ValueError:
+            raise NotFound(self.invalid_before_message)
+
+    def paginate_feed(self, user, request):
+        self.request = request
+        page_size = self.get_page_size(request)
+        ids = get_feed_ids(user, page_size + 1, self.get_before(request))
+        self.next_before = ids[page_size - 1] if len(ids) > page_size else None
+        return ids[:page_size]
+
+    def get_next_link(self):
+        if self.next_before is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.before_query_param,
+            self.next_before
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
@@ -0,0 +1,114 @@
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from rest_framework import serializers
+
+current_profile = ContextVar('current_profile', default=None)
+
+
+def is_cache_query(connection, sql):
+    """Запрос DatabaseCache к своей таблице, а не запрос представления."""
+    return any(
+        connection.ops.quote_name(params['LOCATION']) in sql
+        for params in settings.CACHES.values()
+        if params['BACKEND'].endswith('DatabaseCache')
+    )
+
+
+class RequestProfile:
+    """
+    Запросы к базе и время сериализации одного HTTP-запроса.
+    Запросы кэша в базе учитываются отдельно: бюджеты описывают
+    работу представлений и не зависят от выбранного бэкенда кэша.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.cache_queries = []
+        self.serializer_time = 0
+        self.serializer_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            queries = (self.cache_queries
+                       if is_cache_query(context['connection'], sql)
+                       else self.queries)
+            queries.append(
+                (sql, repr(params), time.perf_counter() - started))
+
+    @property
+    def db_time(self):
+        return sum(duration for _, _, duration in self.queries)
+
+    @property
+    def cache_time(self):
+        return sum(duration for _, _, duration in self.cache_queries)
+
+    def get_repeated_queries(self):
+        """
+        Признак N+1: один и тот же SQL, выполненный с разными
+        параметрами не менее N_PLUS_ONE_THRESHOLD раз.
+        """
+        params = defaultdict(set)
+        for sql, query_params, _ in self.queries:
+            params[sql].add(query_params)
+        return {
+            sql: len(values) for sql, values in params.items()
+            if len(values) >= settings.N_PLUS_ONE_THRESHOLD
+        }
+
+
+def profile_queries(execute, sql, params, many, context):
+    """Обёртка выполнения запросов: пишет их в профиль текущего запроса."""
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile(execute, sql, params, many, context)
+
+
+def install_profiler(connection):
+    if profile_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, profile_queries)
+
+
+@receiver(connection_created)
+def install_profiler_on_connect(connection, **kwargs):
+    """
+    Соединения принадлежат потокам, поэтому обёртка ставится на каждое
+    соединение при подключении: так считаются и запросы асинхронных
+    представлений из потоков пула, которым передаётся контекст корутины.
+    """
+    if settings.QUERY_PROFILING:
+        install_profiler(connection)
+
+
+class ProfiledSerializerMixin:
+    """
+    Добавляет время вычисления .data к профилю текущего запроса.
+    Считается только внешний вызов, вложенные сериализаторы входят в него.
+    """
+
+    @property
+    def data(self):
+        profile = current_profile.get()
+        if profile is None or profile.serializer_depth:
+            return super().data
+        profile.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().data
+        finally:
+            profile.serializer_depth -= 1
+            profile.serializer_time += time.perf_counter() - started
+
+
+class ProfiledListSerializer(ProfiledSerializerMixin,
+                             serializers.ListSerializer):
+    pass
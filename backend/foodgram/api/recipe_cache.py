@@ -0,0 +1,73 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+from api.db_router import get_cache_timeout
+from api.stats import ProcessStats
+from api.versions import get_versions
+
+FRAGMENT_KEY = 'recipe_fragment:{pk}:{digest}'
+
+
+class RecipeFragmentCache:
+    """
+    Кэш не зависящей от пользователя части представления рецепта.
+    Ключ включает версии рецепта, тегов и ингредиентов, поэтому
+    изменение любой из них делает фрагмент недоступным без явного удаления.
+    Попадания и промахи считаются в памяти процесса.
+    """
+
+    def __init__(self):
+        self.stats = ProcessStats('recipe_cache', ('hits', 'misses'))
+
+    @property
+    def cache(self):
+        return caches[settings.RECIPE_CACHE_ALIAS]
+
+    def get_version_names(self, recipe):
+        return (f'recipe:{recipe.pk}', 'tags', 'ingredients')
+
+    def get_keys(self, recipes, host):
+        versions = get_versions({
+            name for recipe in recipes
+            for name in self.get_version_names(recipe)
+        })
+        keys = {}
+        for recipe in recipes:
+            digest = hashlib.md5(host.encode())
+            for name in self.get_version_names(recipe):
+                digest.update(versions[name][0].encode())
+            keys[recipe.pk] = FRAGMENT_KEY.format(
+                pk=recipe.pk, digest=digest.hexdigest())
+        return keys
+
+    def represent(self, recipes, serializer):
+        """
+        Возвращает представления рецептов, достраивая отсутствующие
+        в кэше фрагменты и накладывая поверх них поля пользователя.
+        """
+        request = serializer.context['request']
+        keys = self.get_keys(recipes, request.build_absolute_uri('/'))
+        cached = self.cache.get_many(keys.values())
+        missing = {}
+        result = []
+        for recipe in recipes:
+            key = keys[recipe.pk]
+            fragment = cached.get(key)
+            if fragment is None:
+                fragment = serializer.build_representation(recipe)
+                missing[key] = fragment
+            result.append(serializer.merge_user_fields(fragment, recipe))
+        if missing:
+            self.cache.set_many(
+                missing, get_cache_timeout(settings.RECIPE_CACHE_TIMEOUT))
+        self.stats.add('hits', len(recipes) - len(missing))
+        self.stats.add('misses', len(missing))
+        return result
+
+    def get_stats(self):
+        return self.stats.get_stats()
+
+
+recipe_cache = RecipeFragmentCache()
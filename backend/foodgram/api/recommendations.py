@@ -0,0 +1,167 @@
+from array import array
+from collections import Counter, defaultdict
+from heapq import merge, nlargest
+from itertools import groupby
+from math import sqrt
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from recipes.models import Favorite, Recipe, ShoppingCart, SimilarRecipe
+
+
+def load_interactions(chunk_size):
+    """
+    Пары (id пользователя, id рецепта) из избранного и списков покупок,
+    упорядоченные по пользователю, а у пользователя - по порядку
+    добавления: сначала избранное, затем список покупок. Строки читаются
+    из БД порциями по chunk_size, на PostgreSQL - серверным курсором.
+    """
+    return merge(*(
+        model.objects.order_by('user_id', 'id').values_list(
+            'user_id', 'recipe_id').iterator(chunk_size=chunk_size)
+        for model in (Favorite, ShoppingCart)
+    ), key=itemgetter(0))
+
+
+class CoOccurrence:
+    """
+    Совместная встречаемость рецептов у пользователей. Рецепты каждого
+    пользователя и пользователи каждого рецепта хранятся массивами
+    array('I'), по 8 байт на пару. Счётчики совместной встречаемости
+    строятся для одного рецепта за раз, матрица целиком в памяти
+    не хранится.
+    """
+
+    def __init__(self, pairs, max_user_items):
+        # pairs упорядочены по пользователю, у пользователя - от старых
+        # к новым: учитываются max_user_items последних рецептов.
+        # Пользователи с одним рецептом не дают пар и не сохраняются.
+        self.items = array('I')
+        self.user_starts = array('I', [0])
+        for _, group in groupby(pairs, key=itemgetter(0)):
+            recipe_ids = [recipe_id for _, recipe_id in group]
+            basket = list(dict.fromkeys(reversed(recipe_ids)))[
+                :max_user_items]
+            if len(basket) > 1:
+                self.items.extend(basket)
+                self.user_starts.append(len(self.items))
+
+        size = max(self.items, default=0) + 1
+        self.popularity = array('I', bytes(4 * size))
+        for recipe_id in self.items:
+            self.popularity[recipe_id] += 1
+        self.recipe_starts = array('I', bytes(4 * (size + 1)))
+        for recipe_id in range(size):
+            self.recipe_starts[recipe_id + 1] = (
+                self.recipe_starts[recipe_id] + self.popularity[recipe_id])
+        self.users = array('I', bytes(4 * len(self.items)))
+        positions = self.recipe_starts[:-1]
+        for user in range(len(self.user_starts) - 1):
+            for recipe_id in self._basket(user):
+                self.users[positions[recipe_id]] = user
+                positions[recipe_id] += 1
+
+    @property
+    def pairs_count(self):
+        return len(self.items)
+
+    @property
+    def users_count(self):
+        return len(self.user_starts) - 1
+
+    def _basket(self, user):
+        return self.items[self.user_starts[user]:self.user_starts[user + 1]]
+
+    def recipe_ids(self):
+        return (recipe_id for recipe_id, count in enumerate(self.popularity)
+                if count)
+
+    def neighbours(self, recipe_id, limit, min_count=1):
+        """
+        До limit пар (сходство, id рецепта) по косинусной мере:
+        число общих пользователей, делённое на корень из произведения
+        чисел пользователей обоих рецептов.
+        """
+        counts = Counter()
+        for user in self.users[self.recipe_starts[recipe_id]:
+                               self.recipe_starts[recipe_id + 1]]:
+            counts.update(self._basket(user))
+        del counts[recipe_id]
+        popularity = self.popularity
+        own = popularity[recipe_id]
+        return nlargest(limit, (
+            (count / sqrt(own * popularity[other]), other)
+            for other, count in counts.items() if count >= min_count
+        ))
+
+
+def build_similar_recipes(co_occurrence, limit, min_count, batch_size):
+    """
+    Заменяет таблицу похожих рецептов соседями из co_occurrence.
+    Строки пишутся пачками по batch_size в одной транзакции, поэтому
+    читатели видят прежних соседей до конца построения. Рецепты,
+    удалённые за время построения, пропускаются.
+    """
+    rows = (
+        SimilarRecipe(recipe_id=recipe_id, similar_id=other, score=score)
+        for recipe_id in co_occurrence.recipe_ids()
+        for score, other in co_occurrence.neighbours(
+            recipe_id, limit, min_count)
+    )
+    created = 0
+    with transaction.atomic():
+        SimilarRecipe.objects.all().delete()
+        while True:
+            batch = [row for _, row in zip(range(batch_size), rows)]
+            if not batch:
+                break
+            existing = set(Recipe.objects.filter(id__in={
+                pk for row in batch for pk in (row.recipe_id, row.similar_id)
+            }).values_list('id', flat=True))
+            batch = [row for row in batch if row.recipe_id in existing
+                     and row.similar_id in existing]
+            SimilarRecipe.objects.bulk_create(batch)
+            created += len(batch)
+    return created
+
+
+def get_similar_ids(recipe_id, limit):
+    """id похожих рецептов по убыванию сходства - одно чтение по индексу."""
+    return list(SimilarRecipe.objects.filter(
+        recipe_id=recipe_id
+    ).order_by('-score').values_list('similar_id', flat=True)[:limit])
+
+
+def get_recommended_ids(user, limit):
+    """
+    id рецептов, похожих на последние рецепты пользователя в избранном
+    и списке покупок, по убыванию суммы сходства. Рецепты, которые уже
+    есть у пользователя, пропускаются. Без истории - популярные рецепты.
+    """
+    recent = settings.RECOMMENDATIONS_RECENT_ITEMS
+    favorites = Favorite.objects.filter(user=user)
+    cart = ShoppingCart.objects.filter(user=user)
+    rows = SimilarRecipe.objects.filter(
+        Q(recipe_id__in=favorites.order_by('-id').values(
+            'recipe_id')[:recent])
+        | Q(recipe_id__in=cart.order_by('-id').values('recipe_id')[:recent])
+    ).exclude(
+        similar_id__in=favorites.values('recipe_id')
+    ).exclude(
+        similar_id__in=cart.values('recipe_id')
+    ).values_list('similar_id', 'score')
+    scores = defaultdict(float)
+    for similar_id, score in rows:
+        scores[similar_id] += score
+    if scores:
+        return [recipe_id for _, recipe_id in nlargest(
+            limit, ((score, recipe_id) for recipe_id, score in scores.items())
+        )]
+    return list(Recipe.objects.exclude(
+        id__in=favorites.values('recipe_id')
+    ).exclude(
+        id__in=cart.values('recipe_id')
+    ).order_by('-favorites_count', '-id').values_list('id', flat=True)[:limit])
@@ -0,0 +1,262 @@
+import math
+import sys
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from heapq import nlargest
+from threading import Lock
+
+from django.db import connection
+from django.db.models import (BooleanField, Case, FloatField, IntegerField,
+                              Value, When)
+from django.db.models.expressions import RawSQL
+
+from api.stemmer import analyze
+from api.journal import JournaledIndex, get_journal_head
+from api.versions import get_versions
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+
+# Веса полей рецепта в тех же пропорциях, что веса A, B и C в
+# ts_rank_cd (1.0, 0.4, 0.2), целыми числами ради экономии памяти.
+FIELD_WEIGHTS = (('name', 5), ('ingredients', 2), ('text', 1))
+SEARCH_JOURNAL = 'recipe_search'
+INGREDIENTS_VERSION = 'ingredients'
+# Параметры ранжирования BM25.
+BM25_K1 = 1.2
+BM25_B = 0.75
+TSQUERY = "plainto_tsquery('russian', %s)"
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('russian', recipes_recipe.name), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(("
+    "SELECT string_agg(i.name, ' ') FROM recipes_recipeingredient ri "
+    "JOIN recipes_ingredient i ON i.id = ri.ingredient_id "
+    "WHERE ri.recipe_id = recipes_recipe.id), '')), 'B') || "
+    "setweight(to_tsvector('russian', recipes_recipe.text), 'C')"
+)
+
+
+class IngredientPrefixIndex:
+    """
+    Отсортированный массив названий ингредиентов в памяти процесса.
+    Префиксный поиск выполняется бинарным поиском, поиск по подстроке -
+    проходом по массиву. Массив перечитывается, когда меняется общая
+    версия ингредиентов, поэтому изменения видны всем процессам.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._entries = None
+        self._keys = None
+        self._version = None
+
+    def _load(self):
+        # Версия читается до строк: если её поменяют во время чтения,
+        # следующий поиск перечитает массив ещё раз.
+        version = get_versions([INGREDIENTS_VERSION])[INGREDIENTS_VERSION][0]
+        with self._lock:
+            if self._entries is None or self._version != version:
+                entries = sorted(
+                    (name.lower(), pk) for pk, name in
+                    Ingredient.objects.values_list('pk', 'name').iterator()
+                )
+                self._keys = [key for key, _ in entries]
+                self._entries = entries
+                self._version = version
+            return self._entries, self._keys
+
+    def search(self, value, limit):
+        """
+        Возвращает id ингредиентов, совпавших по префиксу,
+        и id ингредиентов, совпавших только по подстроке.
+        """
+        value = value.lower()
+        entries, keys = self._load()
+        prefix_ids = []
+        for key, pk in entries[bisect_left(keys, value):]:
+            if len(prefix_ids) >= limit or not key.startswith(value):
+                break
+            prefix_ids.append(pk)
+        substring_ids = []
+        for key, pk in entries:
+            if len(prefix_ids) + len(substring_ids) >= limit:
+                break
+            if value in key and not key.startswith(value):
+                substring_ids.append(pk)
+        return prefix_ids, substring_ids
+
+
+ingredient_index = IngredientPrefixIndex()
+
+
+def search_ingredients(queryset, value, limit):
+    """
+    Ищет ингредиенты по вхождению value в название, ставя совпадения
+    по префиксу выше совпадений по подстроке. На PostgreSQL запрос
+    обслуживается триграммным индексом, на остальных СУБД - индексом
+    в памяти процесса.
+    """
+    if connection.vendor == 'postgresql':
+        return queryset.filter(name__icontains=value).annotate(
+            search_rank=Case(
+                When(name__istartswith=value, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField()
+            )
+        ).order_by('search_rank', 'name')[:limit]
+    prefix_ids, substring_ids = ingredient_index.search(value, limit)
+    return queryset.filter(pk__in=prefix_ids + substring_ids).annotate(
+        search_rank=Case(
+            When(pk__in=prefix_ids, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField()
+        )
+    ).order_by('search_rank', 'name')
+
+
+class RecipeSearchIndex(JournaledIndex):
+    """
+    Инвертированный индекс рецептов в памяти процесса для СУБД без
+    полнотекстового поиска: основа слова -> {id рецепта: взвешенная
+    частота}. Ранжирование по BM25 с весами полей. Изменённые рецепты
+    переиндексируются на месте по журналу изменений.
+    """
+
+    journal = SEARCH_JOURNAL
+
+    def __init__(self):
+        super().__init__()
+        self._postings = None
+        self._documents = None
+        self._total_length = 0
+
+    @staticmethod
+    def _load_rows(recipe_ids=None):
+        recipes = Recipe.objects.order_by()
+        ingredients = RecipeIngredient.objects.order_by()
+        if recipe_ids is not None:
+            recipes = recipes.filter(pk__in=recipe_ids)
+            ingredients = ingredients.filter(recipe_id__in=recipe_ids)
+        names = defaultdict(list)
+        for recipe_id, name in ingredients.values_list(
+                'recipe_id', 'ingredient__name').iterator():
+            names[recipe_id].append(name)
+        for pk, name, text in recipes.values_list(
+                'pk', 'name', 'text').iterator():
+            yield pk, {'name': name, 'text': text,
+                       'ingredients': ' '.join(names[pk])}
+
+    def _add(self, pk, fields):
+        frequencies = Counter()
+        length = 0
+        for field, weight in FIELD_WEIGHTS:
+            terms = analyze(fields[field])
+            length += len(terms)
+            for term in terms:
+                frequencies[sys.intern(term)] += weight
+        for term, frequency in frequencies.items():
+            self._postings[term][pk] = frequency
+        self._documents[pk] = (tuple(frequencies), length)
+        self._total_length += length
+
+    def _discard(self, pk):
+        terms, length = self._documents.pop(pk, ((), 0))
+        self._total_length -= length
+        for term in terms:
+            postings = self._postings[term]
+            postings.pop(pk, None)
+            if not postings:
+                del self._postings[term]
+
+    def build(self, rows):
+        """
+        Строит индекс по парам (id рецепта, поля). Номер журнала
+        читается до строк, чтобы изменения во время построения
+        применились после него.
+        """
+        position = get_journal_head(self.journal)
+        self._postings = defaultdict(dict)
+        self._documents = {}
+        self._total_length = 0
+        for pk, fields in rows:
+            self._add(pk, fields)
+        self._position = position
+
+    def _install(self, index):
+        self._postings = index._postings
+        self._documents = index._documents
+        self._total_length = index._total_length
+
+    def _apply(self, recipe_ids):
+        """Переиндексирует рецепты, удалённые убирает из индекса."""
+        for pk in recipe_ids:
+            self._discard(pk)
+        for pk, fields in self._load_rows(recipe_ids):
+            self._add(pk, fields)
+
+    def search(self, query, limit):
+        """id рецептов, содержащих все слова запроса, по убыванию ранга."""
+        terms = set(analyze(query))
+        if not terms:
+            return []
+        self._sync()
+        with self._lock:
+            postings = [self._postings.get(term, {}) for term in terms]
+            postings.sort(key=len)
+            if not postings[0]:
+                return []
+            count = len(self._documents)
+            average = self._total_length / count or 1
+            idf = [math.log(1 + (count - len(p) + 0.5) / (len(p) + 0.5))
+                   for p in postings]
+            ranked = []
+            for pk in postings[0]:
+                if not all(pk in p for p in postings[1:]):
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B
+                                  * self._documents[pk][1] / average)
+                score = sum(
+                    weight * p[pk] * (BM25_K1 + 1) / (p[pk] + norm)
+                    for weight, p in zip(idf, postings)
+                )
+                ranked.append((score, pk))
+        return [pk for _, pk in nlargest(limit, ranked)]
+
+
+recipe_index = RecipeSearchIndex()
+
+
+def search_recipes(query, limit):
+    """
+    Возвращает до limit id рецептов, в названии, описании или
+    ингредиентах которых есть все слова запроса с учётом словоформ,
+    по убыванию релевантности. На PostgreSQL поиск идёт по колонке
+    search_vector с GIN-индексом, на остальных СУБД - по индексу
+    в памяти процесса.
+    """
+    if connection.vendor != 'postgresql':
+        return recipe_index.search(query, limit)
+    # Колонка search_vector не объявлена в модели, поэтому условие
+    # и ранг задаются выражениями RawSQL.
+    return list(Recipe.objects.filter(RawSQL(
+        f'recipes_recipe.search_vector @@ {TSQUERY}',
+        (query,), output_field=BooleanField())
+    ).annotate(
+        search_rank=RawSQL(
+            f'ts_rank_cd(recipes_recipe.search_vector, {TSQUERY})',
+            (query,), output_field=FloatField())
+    ).order_by('-search_rank', '-id').values_list('id', flat=True)[:limit])
+
+
+def reindex_recipes(recipe_ids):
+    """Обновляет поисковый индекс изменённых или удалённых рецептов."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    if connection.vendor != 'postgresql':
+        recipe_index.update(recipe_ids)
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE recipes_recipe SET search_vector = {SEARCH_VECTOR_SQL} '
+            f'WHERE id = ANY(%s)',
+            [recipe_ids]
+        )
@@ -1,14 +1,19 @@
-from django.shortcuts import get_object_or_404
 from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 
-from api.utils import Base64ImageField
+from api.images import get_rendition_urls
+from api.profiling import ProfiledListSerializer, ProfiledSerializerMixin
+from api.recipe_cache import recipe_cache
+from api.utils import (Base64ImageField, BulkPrimaryKeyRelatedField,
+                       get_recipes_limit)
 from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
 from users.models import User
 
 
-class UserSerializer(UserSerializer):
+class UserSerializer(ProfiledSerializerMixin, UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
@@ -21,15 +26,19 @@ class UserSerializer(UserSerializer):
             'last_name',
             'is_subscribed'
         )
+        list_serializer_class = ProfiledListSerializer
 
     def get_is_subscribed(self, obj):
+        is_subscribed = getattr(obj, 'is_subscribed', None)
+        if is_subscribed is not None:
+            return is_subscribed
         request_user = self.context['request'].user
         if request_user.is_authenticated:
             return obj.following.filter(user=request_user).exists()
         return False
 
 
-class UserCreateSerializer(UserCreateSerializer):
+class UserCreateSerializer(ProfiledSerializerMixin, UserCreateSerializer):
     password = serializers.CharField(style={'input_type': 'password'},
                                      write_only=True)
 
@@ -45,7 +54,7 @@ class UserCreateSerializer(UserCreateSerializer):
         )
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Tag
@@ -55,9 +64,11 @@ class TagSerializer(serializers.ModelSerializer):
             'color',
             'slug'
         )
+        list_serializer_class = ProfiledListSerializer
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(ProfiledSerializerMixin,
+                           serializers.ModelSerializer):
 
     class Meta:
         model = Ingredient
@@ -66,6 +77,7 @@ class IngredientSerializer(serializers.ModelSerializer):
             'name',
             'measurement_unit'
         )
+        list_serializer_class = ProfiledListSerializer
 
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
@@ -87,7 +99,14 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         )
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeListSerializer(ProfiledListSerializer):
+
+    def to_representation(self, data):
+        recipes = list(data.all() if hasattr(data, 'all') else data)
+        return recipe_cache.represent(recipes, self.child)
+
+
+class RecipeSerializer(ProfiledSerializerMixin, serializers.ModelSerializer):
 
     author = UserSerializer(
         read_only=True
@@ -104,6 +123,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField(required=False)
+    image_renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -116,26 +136,73 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_renditions',
             'text',
             'cooking_time'
         )
+        list_serializer_class = RecipeListSerializer
+
+    def to_representation(self, instance):
+        return recipe_cache.represent([instance], self)[0]
+
+    def _annotate_author(self, instance):
+        author_is_subscribed = getattr(instance, 'author_is_subscribed', None)
+        if author_is_subscribed is not None:
+            instance.author.is_subscribed = author_is_subscribed
+
+    def build_representation(self, instance):
+        """Представление рецепта без полей, зависящих от пользователя."""
+        self._annotate_author(instance)
+        data = super().to_representation(instance)
+        data['is_favorited'] = None
+        data['is_in_shopping_cart'] = None
+        data['author']['is_subscribed'] = None
+        return data
+
+    def merge_user_fields(self, data, instance):
+        self._annotate_author(instance)
+        data = data.copy()
+        data['is_favorited'] = self.get_is_favorited(instance)
+        data['is_in_shopping_cart'] = self.get_is_in_shopping_cart(instance)
+        data['author'] = data['author'].copy()
+        data['author']['is_subscribed'] = (
+            self.fields['author'].get_is_subscribed(instance.author))
+        return data
+
+    def get_image_renditions(self, obj):
+        return get_rendition_urls(obj, self.context['request'])
 
     def get_is_favorited(self, obj):
+        is_favorited = getattr(obj, 'is_favorited', None)
+        if is_favorited is not None:
+            return is_favorited
         request = self.context['request']
         if request.user.is_authenticated:
             return obj.favorited_by_users.filter(user=request.user).exists()
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        is_in_shopping_cart = getattr(obj, 'is_in_shopping_cart', None)
+        if is_in_shopping_cart is not None:
+            return is_in_shopping_cart
         request = self.context['request']
         if request.user.is_authenticated:
             return obj.added_to_carts.filter(user=request.user).exists()
         return False
 
 
+class IngredientAddListSerializer(serializers.ListSerializer):
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.child.fields['id'].preload(
+                item.get('id') for item in data if isinstance(item, dict))
+        return super().to_internal_value(data)
+
+
 class IngredientAddSerializer(serializers.ModelSerializer):
 
-    id = serializers.PrimaryKeyRelatedField(
+    id = BulkPrimaryKeyRelatedField(
         source='ingredient',
         queryset=Ingredient.objects.all()
     )
@@ -150,9 +217,12 @@ class IngredientAddSerializer(serializers.ModelSerializer):
             'id',
             'amount'
         )
+        list_serializer_class = IngredientAddListSerializer
 
 
-class RecipeCreateSerializer(serializers.ModelSerializer):
+class RecipeCreateSerializer(ProfiledSerializerMixin,
+                             serializers.ModelSerializer):
+    serializer_related_field = BulkPrimaryKeyRelatedField
 
     ingredients = IngredientAddSerializer(
         many=True, source='recipe_ingredients'
@@ -187,24 +257,52 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             seen.add(ingredient_name)
         return ingredients
 
-    def _bulk_create_recipe_ingredients(self, recipe, ingredients_data):
-        recipe_ingredients = []
-
-        for ingredient_data in ingredients_data:
-            ingredient_id = ingredient_data['ingredient'].id
-            amount = ingredient_data['amount']
-
-            ingredient = get_object_or_404(Ingredient, id=ingredient_id)
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        finally:
+            image = self.validated_data.get('image')
+            if isinstance(image, UploadedFile):
+                # Закрываем декодированный файл, удаляя временную копию.
+                image.close()
 
-            recipe_ingredients.append(
-                RecipeIngredient(
-                    recipe=recipe,
-                    ingredient=ingredient,
-                    amount=amount
-                )
+    def _bulk_create_recipe_ingredients(self, recipe, ingredients_data):
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=ingredient_data['ingredient'],
+                amount=ingredient_data['amount']
             )
+            for ingredient_data in ingredients_data
+        )
 
-        RecipeIngredient.objects.bulk_create(recipe_ingredients)
+    def _update_recipe_ingredients(self, recipe, ingredients_data):
+        """
+        Приводит ингредиенты рецепта к переданному списку не более чем
+        тремя запросами: изменяет количество у оставшихся, добавляет
+        новые и удаляет исключённые.
+        """
+        existing = {
+            item.ingredient_id: item
+            for item in recipe.recipe_ingredients.all()
+        }
+        changed = []
+        added = []
+        for ingredient_data in ingredients_data:
+            item = existing.pop(ingredient_data['ingredient'].id, None)
+            if item is None:
+                added.append(ingredient_data)
+            elif item.amount != ingredient_data['amount']:
+                item.amount = ingredient_data['amount']
+                changed.append(item)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        if added:
+            self._bulk_create_recipe_ingredients(recipe, added)
+        if existing:
+            RecipeIngredient.objects.filter(
+                pk__in=[item.pk for item in existing.values()]
+            ).delete()
 
     def create(self, validated_data):
         ingredients_data = validated_data.pop('recipe_ingredients')
@@ -217,6 +315,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         recipe.tags.set(tags_data)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         instance.name = validated_data.get('name', instance.name)
         instance.text = validated_data.get('text', instance.text)
@@ -226,21 +325,21 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         if 'image' in validated_data:
             instance.image = validated_data['image']
 
-        ingredients_data = validated_data.get('recipe_ingredients', [])
-        tags_data = validated_data.pop('tags')
-
-        instance.recipe_ingredients.delete()
-        self._bulk_create_recipe_ingredients(instance, ingredients_data)
+        if 'recipe_ingredients' in validated_data:
+            self._update_recipe_ingredients(
+                instance, validated_data['recipe_ingredients'])
 
-        instance.tags.clear()
-        instance.tags.set(tags_data)
+        if 'tags' in validated_data:
+            # set() сам вычисляет разницу и не трогает оставшиеся теги.
+            instance.tags.set(validated_data['tags'])
 
         instance.save()
-
         return instance
 
 
-class RecipeMinifiedSerializer(serializers.ModelSerializer):
+class RecipeMinifiedSerializer(ProfiledSerializerMixin,
+                               serializers.ModelSerializer):
+    image_renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -248,13 +347,18 @@ class RecipeMinifiedSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_renditions',
             'cooking_time'
         )
+        list_serializer_class = ProfiledListSerializer
+
+    def get_image_renditions(self, obj):
+        return get_rendition_urls(obj, self.context['request'])
 
 
 class SubscribedUserSerializer(UserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta:
         model = User
@@ -268,22 +372,31 @@ class SubscribedUserSerializer(UserSerializer):
             'recipes',
             'recipes_count'
         )
+        list_serializer_class = ProfiledListSerializer
 
     def get_recipes(self, obj):
-        recipes_limit = self.context['request'].query_params.get(
-            'recipes_limit', None)
-        try:
-            recipes_limit_int = int(recipes_limit)
-        except (TypeError, ValueError):
-            recipes_limit_int = None
-
-        recipes = (
-            obj.recipes.all()[:recipes_limit_int]
-            if recipes_limit_int is not None
-            else obj.recipes.all()
-        )
-        serializer = RecipeMinifiedSerializer(recipes, many=True)
+        recipes = getattr(obj, 'recipes_preview', None)
+        if recipes is None:
+            recipes_limit = get_recipes_limit(self.context['request'])
+            recipes = obj.recipes.order_by('-id')[:recipes_limit]
+        serializer = RecipeMinifiedSerializer(
+            recipes, many=True, context=self.context)
         return serializer.data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
+
+class BulkIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_IDS
+    )
+
+
+class CookableQuerySerializer(serializers.Serializer):
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.COOKABLE_MAX_INGREDIENTS
+    )
+    min_coverage = serializers.FloatField(
+        min_value=0, max_value=1, default=0)
@@ -0,0 +1,162 @@
+import csv
+import io
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from PIL import Image, ImageDraw, ImageFont
+
+from api.db_router import get_cache_timeout
+from api.versions import bump_versions, get_versions
+from recipes.models import RecipeIngredient, ShoppingCart
+
+CART_VERSION = 'shopping_cart:{user_id}'
+CART_INGREDIENTS_KEY = 'shopping_cart:{user_id}:{version}'
+TITLE = 'Список покупок:'
+FOOTER = 'Foodgram - Вкус момента, разделяемый миром!'
+
+
+def get_cart_version(user_id):
+    name = CART_VERSION.format(user_id=user_id)
+    token, _ = get_versions([name])[name]
+    return token
+
+
+def bump_cart_versions(user_ids):
+    """Инвалидирует закэшированные списки покупок пользователей."""
+    bump_versions([CART_VERSION.format(user_id=user_id)
+                   for user_id in user_ids])
+
+
+def bump_recipe_carts(recipe_ids):
+    """Инвалидирует списки покупок, в которые входят рецепты recipe_ids."""
+    bump_cart_versions(ShoppingCart.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('user_id', flat=True).distinct())
+
+
+def get_cart_ingredients(user):
+    """
+    Возвращает суммированные ингредиенты из корзины пользователя.
+    Результат кэшируется по версии корзины, поэтому повторная выгрузка
+    неизменённой корзины не обращается к базе данных.
+    """
+    key = CART_INGREDIENTS_KEY.format(
+        user_id=user.id, version=get_cart_version(user.id))
+    ingredients = cache.get(key)
+    if ingredients is None:
+        ingredients = [
+            (name, unit, amount) for name, unit, amount in
+            RecipeIngredient.objects.filter(
+                recipe__added_to_carts__user=user
+            ).values(
+                'ingredient__name',
+                'ingredient__measurement_unit'
+            ).annotate(
+                total_amount=Sum('amount')
+            ).order_by('ingredient__name').values_list(
+                'ingredient__name',
+                'ingredient__measurement_unit',
+                'total_amount'
+            ).iterator()
+        ]
+        cache.set(key, ingredients,
+                  get_cache_timeout(settings.SHOPPING_CART_CACHE_TIMEOUT))
+    return ingredients
+
+
+class Echo:
+    """Буфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class TextExporter:
+    content_type = 'text/plain; charset=utf-8'
+    extension = 'txt'
+
+    def render(self, ingredients):
+        yield f'{TITLE}\n'
+        for name, unit, amount in ingredients:
+            yield f'\n {name} - {amount} {unit}'
+        yield f'\n\n{FOOTER}'
+
+
+class CSVExporter:
+    content_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+
+    def render(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for row in ingredients:
+            yield writer.writerow(row)
+
+
+class JSONExporter:
+    content_type = 'application/json'
+    extension = 'json'
+
+    def render(self, ingredients):
+        yield '['
+        for index, (name, unit, amount) in enumerate(ingredients):
+            yield (',' if index else '') + json.dumps(
+                {'name': name, 'measurement_unit': unit, 'amount': amount},
+                ensure_ascii=False
+            )
+        yield ']'
+
+
+class PDFExporter:
+    """
+    Рисует список средствами Pillow и сохраняет страницы в PDF,
+    не обращаясь к внешним сервисам.
+    """
+    content_type = 'application/pdf'
+    extension = 'pdf'
+    page_size = (1240, 1754)
+    margin = 100
+    font_size = 32
+    line_height = 48
+    chunk_size = 64 * 1024
+
+    def get_font(self):
+        try:
+            return ImageFont.truetype(
+                settings.SHOPPING_CART_PDF_FONT, self.font_size)
+        except OSError:
+            return ImageFont.load_default()
+
+    def get_lines(self, ingredients):
+        yield TITLE
+        yield ''
+        for name, unit, amount in ingredients:
+            yield f'{name} - {amount} {unit}'
+        yield ''
+        yield FOOTER
+
+    def render(self, ingredients):
+        font = self.get_font()
+        lines_per_page = (
+            (self.page_size[1] - 2 * self.margin) // self.line_height)
+        pages = []
+        for index, line in enumerate(self.get_lines(ingredients)):
+            if index % lines_per_page == 0:
+                page = Image.new('L', self.page_size, 255)
+                draw = ImageDraw.Draw(page)
+                pages.append(page)
+            top = self.margin + index % lines_per_page * self.line_height
+            draw.text((self.margin, top), line, fill=0, font=font)
+        buffer = io.BytesIO()
+        pages[0].save(buffer, format='PDF', save_all=True,
+                      append_images=pages[1:], resolution=150)
+        buffer.seek(0)
+        yield from iter(lambda: buffer.read(self.chunk_size), b'')
+
+
+EXPORTERS = {
+    exporter.extension: exporter
+    for exporter in (TextExporter, CSVExporter, JSONExporter, PDFExporter)
+}
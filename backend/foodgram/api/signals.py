@@ -0,0 +1,143 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from api.cookable import cookable_index
+from api.search import INGREDIENTS_VERSION, reindex_recipes
+from api.shopping_cart import bump_cart_versions, bump_recipe_carts
+from api.versions import bump_versions_on_commit
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.counters import change_counter, counted_in_bulk
+from users.models import Follow, User
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredients(**kwargs):
+    bump_versions_on_commit([INGREDIENTS_VERSION])
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_ingredient_recipes(instance, created, **kwargs):
+    if not created:
+        recipe_ids = list(instance.recipeingredient_set.values_list(
+            'recipe_id', flat=True))
+        transaction.on_commit(lambda: reindex_recipes(recipe_ids))
+        transaction.on_commit(lambda: bump_recipe_carts(recipe_ids))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tags(**kwargs):
+    bump_versions_on_commit(['tags'])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe(instance, **kwargs):
+    bump_versions_on_commit([f'recipe:{instance.pk}'])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def reindex_recipe(instance, **kwargs):
+    # Ингредиенты сохраняются после рецепта, поэтому индекс
+    # обновляется после фиксации транзакции. После удаления pk
+    # объекта обнуляется, поэтому id запоминается сразу.
+    recipe_ids = [instance.pk]
+    transaction.on_commit(lambda: reindex_recipes(recipe_ids))
+    transaction.on_commit(lambda: cookable_index.update(recipe_ids))
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_recipe_carts(instance, created, **kwargs):
+    # Списки покупок собираются из строк RecipeIngredient, которые
+    # сериализатор меняет пакетно без сигналов, поэтому версии корзин
+    # меняются после фиксации всех изменений рецепта. При удалении
+    # рецепта корзины сбрасывает каскадное удаление их строк.
+    if not created:
+        recipe_ids = [instance.pk]
+        transaction.on_commit(lambda: bump_recipe_carts(recipe_ids))
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def invalidate_recipe_ingredients(instance, **kwargs):
+    bump_versions_on_commit([f'recipe:{instance.recipe_id}'])
+    recipe_ids = [instance.recipe_id]
+    transaction.on_commit(lambda: reindex_recipes(recipe_ids))
+    transaction.on_commit(lambda: cookable_index.update(recipe_ids))
+    transaction.on_commit(lambda: bump_recipe_carts(recipe_ids))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        bump_versions_on_commit([f'recipe:{instance.pk}'])
+    elif pk_set:
+        bump_versions_on_commit([f'recipe:{pk}' for pk in pk_set])
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_user_flags(instance, **kwargs):
+    bump_versions_on_commit([f'user_flags:{instance.user_id}'])
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def invalidate_cart(instance, **kwargs):
+    user_ids = [instance.user_id]
+    transaction.on_commit(lambda: bump_cart_versions(user_ids))
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    bump_versions_on_commit([
+        f'recipe:{pk}'
+        for pk in instance.recipes.values_list('pk', flat=True)
+    ])
+
+
+# Денормализованные счётчики: связь -> (поле владельца, модель, счётчик).
+COUNTED_RELATIONS = {
+    Recipe: ('author_id', User, 'recipes_count'),
+    Favorite: ('recipe_id', Recipe, 'favorites_count'),
+    ShoppingCart: ('recipe_id', Recipe, 'in_carts_count'),
+    Follow: ('following_id', User, 'followers_count'),
+}
+
+
+def update_counter(sender, instance, delta):
+    if counted_in_bulk.get():
+        return
+    field, model, counter = COUNTED_RELATIONS[sender]
+    change_counter(model, getattr(instance, field), counter, delta)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Follow)
+def increment_counter(sender, instance, created, raw=False, **kwargs):
+    # Счётчики ведутся сигналами, чтобы их не обходили админка,
+    # ORM и каскадное удаление.
+    if created and not raw:
+        update_counter(sender, instance, 1)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Follow)
+def decrement_counter(sender, instance, **kwargs):
+    update_counter(sender, instance, -1)
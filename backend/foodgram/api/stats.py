@@ -0,0 +1,50 @@
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+class ProcessStats:
+    """
+    Счётчики в памяти процесса: учёт события не обращается к кэшу.
+    У каждого воркера свои значения, они отдаются эндпоинтом
+    /api/stats/ и раз в STATS_LOG_SECONDS пишутся в лог с pid.
+    """
+
+    def __init__(self, name, fields):
+        self.name = name
+        self._counts = dict.fromkeys(fields, 0)
+        self._lock = threading.Lock()
+        self._logged_at = time.monotonic()
+        registry[name] = self
+
+    def add(self, field, value=1):
+        if not value:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._counts[field] += value
+            due = now - self._logged_at >= settings.STATS_LOG_SECONDS
+            if due:
+                self._logged_at = now
+                counts = dict(self._counts)
+        if due:
+            logger.info('%s, pid %d: %s', self.name, os.getpid(), counts)
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+def get_process_stats():
+    """Счётчики всех подсистем процесса, обработавшего запрос."""
+    return {
+        'pid': os.getpid(),
+        **{name: stats.get_stats() for name, stats in registry.items()},
+    }
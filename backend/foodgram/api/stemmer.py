@@ -0,0 +1,144 @@
+import re
+from functools import lru_cache
+
+VOWELS = 'аеиоуыэюя'
+WORD_RE = re.compile(r'[а-яёa-z0-9]+')
+
+# Окончания алгоритма Snowball для русского языка. True - окончание
+# удаляется, только если перед ним стоит «а» или «я».
+PERFECTIVE_GERUND = {
+    'в': True, 'вши': True, 'вшись': True,
+    'ив': False, 'ивши': False, 'ившись': False,
+    'ыв': False, 'ывши': False, 'ывшись': False,
+}
+ADJECTIVE = dict.fromkeys((
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+    'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+    'ая', 'яя', 'ою', 'ею'
+), False)
+PARTICIPLE = {
+    'ем': True, 'нн': True, 'вш': True, 'ющ': True, 'щ': True,
+    'ивш': False, 'ывш': False, 'ующ': False,
+}
+REFLEXIVE = {'ся': False, 'сь': False}
+VERB = {
+    **dict.fromkeys((
+        'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+        'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'
+    ), True),
+    **dict.fromkeys((
+        'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей',
+        'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят',
+        'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'
+    ), False),
+}
+NOUN = dict.fromkeys((
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+    'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+    'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+    'ья', 'я'
+), False)
+DERIVATIONAL = ('ость', 'ост')
+TIDY_UP = ('ейше', 'ейш', 'н', 'ь')
+
+STOP_WORDS = frozenset((
+    'и', 'в', 'во', 'не', 'что', 'он', 'на', 'я', 'с', 'со', 'как', 'а',
+    'то', 'все', 'она', 'так', 'его', 'но', 'да', 'ты', 'к', 'у', 'же',
+    'вы', 'за', 'бы', 'по', 'только', 'ее', 'мне', 'было', 'вот', 'от',
+    'меня', 'еще', 'нет', 'о', 'из', 'ему', 'теперь', 'когда', 'даже',
+    'ну', 'вдруг', 'ли', 'если', 'уже', 'или', 'ни', 'быть', 'был', 'него',
+    'до', 'вас', 'нибудь', 'опять', 'уж', 'вам', 'ведь', 'там', 'потом',
+    'себя', 'ничего', 'ей', 'может', 'они', 'тут', 'где', 'есть', 'надо',
+    'ней', 'для', 'мы', 'тебя', 'их', 'чем', 'была', 'сам', 'чтоб', 'без',
+    'будто', 'чего', 'раз', 'тоже', 'себе', 'под', 'будет', 'ж', 'тогда',
+    'кто', 'этот', 'того', 'потому', 'этого', 'какой', 'совсем', 'ним',
+    'здесь', 'этом', 'один', 'почти', 'мой', 'тем', 'чтобы', 'нее',
+    'сейчас', 'были', 'куда', 'зачем', 'всех', 'никогда', 'можно', 'при',
+    'наконец', 'два', 'об', 'другой', 'хоть', 'после', 'над', 'больше',
+    'тот', 'через', 'эти', 'нас', 'про', 'всего', 'них', 'какая', 'много',
+    'разве', 'три', 'эту', 'моя', 'впрочем', 'хорошо', 'свою', 'этой',
+    'перед', 'иногда', 'лучше', 'чуть', 'том', 'нельзя', 'такой', 'им',
+    'более', 'всегда', 'конечно', 'всю', 'между',
+))
+
+
+def _region(word, start):
+    """Начало области после первой согласной, следующей за гласной."""
+    for index in range(start + 1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            return index + 1
+    return len(word)
+
+
+def _suffix(word, endings):
+    """Самое длинное из окончаний, которым заканчивается слово."""
+    for ending in sorted(endings, key=len, reverse=True):
+        if word.endswith(ending):
+            return ending
+    return None
+
+
+def _remove(word, endings):
+    """
+    Удаляет самое длинное подходящее окончание. Если у него не
+    выполнено условие о предшествующей «а» или «я», слово не меняется
+    и возвращается None, как в Snowball.
+    """
+    ending = _suffix(word, endings)
+    if ending is None:
+        return None
+    rest = word[:-len(ending)]
+    if endings[ending] and not rest.endswith(('а', 'я')):
+        return None
+    return rest
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    """Основа слова по алгоритму Snowball для русского языка."""
+    word = word.lower().replace('ё', 'е')
+    rv = next((index + 1 for index, char in enumerate(word)
+               if char in VOWELS), len(word))
+    r2 = _region(word, _region(word, 0))
+    prefix, rest = word[:rv], word[rv:]
+
+    result = _remove(rest, PERFECTIVE_GERUND)
+    if result is None:
+        reflexive = _remove(rest, REFLEXIVE)
+        if reflexive is not None:
+            rest = reflexive
+        result = _remove(rest, ADJECTIVE)
+        if result is not None:
+            participle = _remove(result, PARTICIPLE)
+            if participle is not None:
+                result = participle
+        else:
+            result = _remove(rest, VERB)
+            if result is None:
+                result = _remove(rest, NOUN)
+    if result is not None:
+        rest = result
+
+    if rest.endswith('и'):
+        rest = rest[:-1]
+
+    ending = _suffix(rest, DERIVATIONAL)
+    if ending and rv + len(rest) - len(ending) >= r2:
+        rest = rest[:-len(ending)]
+
+    ending = _suffix(rest, TIDY_UP)
+    if ending in ('ейше', 'ейш'):
+        rest = rest[:-len(ending)]
+        if rest.endswith('нн'):
+            rest = rest[:-1]
+    elif ending == 'н' and rest.endswith('нн'):
+        rest = rest[:-1]
+    elif ending == 'ь':
+        rest = rest[:-1]
+    return prefix + rest
+
+
+def analyze(text):
+    """Основы слов текста без стоп-слов, в порядке появления."""
+    words = WORD_RE.findall(text.lower().replace('ё', 'е'))
+    return [stem(word) for word in words if word not in STOP_WORDS]
@@ -0,0 +1,87 @@
+from api.tests.test_query_counts import QueryCountTestCase
+from api.utils import create_objects, delete_objects
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow, User
+
+
+class BulkRelationTest(QueryCountTestCase):
+    """Пакетные связи: результат по каждому id, счётчики и число запросов."""
+
+    def setUp(self):
+        super().setUp()
+        self.recipes = list(Recipe.objects.order_by('id'))
+        self.missing = Recipe.objects.order_by('-id').first().pk + 1
+
+    def assertCounters(self, objects, field, value):
+        for obj in objects:
+            obj.refresh_from_db(fields=[field])
+            self.assertEqual(getattr(obj, field), value)
+
+    def test_create_statuses(self):
+        kept, removed = self.recipes[:2]
+        Favorite.objects.filter(user=self.user, recipe=removed).delete()
+        results = create_objects(
+            self.user, [kept.pk, removed.pk, self.missing, removed.pk],
+            Favorite)
+        self.assertEqual(results, [
+            {'id': kept.pk, 'status': 'exists'},
+            {'id': removed.pk, 'status': 'created'},
+            {'id': self.missing, 'status': 'not_found'},
+        ])
+        self.assertCounters([kept, removed], 'favorites_count', 1)
+
+    def test_follow_statuses(self):
+        author = User.objects.get(username='author0')
+        stranger = User.objects.create_user(
+            username='stranger', email='stranger@example.com')
+        results = create_objects(
+            self.user, [author.pk, stranger.pk, self.user.pk], Follow)
+        self.assertEqual(results, [
+            {'id': author.pk, 'status': 'exists'},
+            {'id': stranger.pk, 'status': 'created'},
+            {'id': self.user.pk, 'status': 'self'},
+        ])
+        self.assertFalse(Follow.objects.filter(
+            user=self.user, following=self.user).exists())
+        self.assertCounters([author, stranger], 'followers_count', 1)
+
+    def test_delete_statuses(self):
+        recipe = self.recipes[0]
+        results = delete_objects(
+            self.user, [recipe.pk, self.missing], ShoppingCart)
+        self.assertEqual(results, [
+            {'id': recipe.pk, 'status': 'deleted'},
+            {'id': self.missing, 'status': 'absent'},
+        ])
+        self.assertCounters([recipe], 'in_carts_count', 0)
+        results = delete_objects(self.user, [recipe.pk], ShoppingCart)
+        self.assertEqual(results, [{'id': recipe.pk, 'status': 'absent'}])
+        self.assertCounters([recipe], 'in_carts_count', 0)
+
+    def test_routes(self):
+        ids = [recipe.pk for recipe in self.recipes[:3]]
+        response = self.client.delete(
+            '/api/recipes/favorite/', {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['deleted'] * 3)
+        response = self.client.post(
+            '/api/recipes/favorite/', {'ids': ids}, format='json')
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['created'] * 3)
+        self.assertCounters(self.recipes[:3], 'favorites_count', 1)
+        response = self.client.post(
+            '/api/recipes/shopping_cart/', {'ids': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_count(self):
+        # Число запросов не зависит от количества id в пакете.
+        for recipes in (self.recipes[:1], self.recipes):
+            ids = [recipe.pk for recipe in recipes]
+            with self.assertNumQueries(7):
+                delete_objects(self.user, ids, Favorite)
+            with self.assertNumQueries(7):
+                create_objects(self.user, ids, Favorite)
+        self.assertCounters(self.recipes, 'favorites_count', 1)
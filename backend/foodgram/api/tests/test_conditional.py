@@ -0,0 +1,67 @@
+from api.tests.test_query_counts import QueryCountTestCase
+from api.versions import get_versions
+from recipes.models import Recipe
+
+
+class VersionBumpTest(QueryCountTestCase):
+
+    def test_bump_after_commit(self):
+        # Версия, прочитанная другим процессом до коммита, устаревает
+        # после него.
+        recipe = Recipe.objects.first()
+        name = f'recipe:{recipe.pk}'
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.name = 'Новое название'
+            recipe.save()
+            before_commit = get_versions([name])[name]
+        self.assertNotEqual(get_versions([name])[name], before_commit)
+
+
+class ConditionalGetTest(QueryCountTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = Recipe.objects.first()
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+
+    def get_etag(self, url=None):
+        response = self.client.get(url or self.url)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_not_modified(self):
+        etag = self.get_etag()
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_recipe_edited(self):
+        etag = self.get_etag()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.name = 'Новое название'
+            self.recipe.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_favorite_toggled(self):
+        etag = self.get_etag()
+        response = self.client.delete(f'{self.url}favorite/')
+        self.assertEqual(response.status_code, 204)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data['is_favorited'])
+
+    def test_per_user_headers(self):
+        response = self.client.get(self.url)
+        self.assertIn('Authorization', response['Vary'])
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_zero_padded_pk(self):
+        url = f'/api/recipes/0{self.recipe.pk}/'
+        etag = self.get_etag(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.name = 'Новое название'
+            self.recipe.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,66 @@
+from unittest import mock
+
+from api.cookable import CookableIndex
+from api.tests.test_query_counts import QueryCountTestCase
+from recipes.models import Recipe, RecipeIngredient
+
+
+class CookableIndexTest(QueryCountTestCase):
+    """Экземпляры индекса изображают разные процессы."""
+
+    def setUp(self):
+        super().setUp()
+        self.first = CookableIndex()
+        self.second = CookableIndex()
+        self.extra = self.ingredients[3]
+        for index in (self.first, self.second):
+            self.assertEqual(index.search([self.extra.pk], 10), [])
+
+    def add_extra(self, recipe):
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=self.extra, amount=1)
+
+    def test_concurrent_updates(self):
+        first, second = Recipe.objects.all()[:2]
+        self.add_extra(first)
+        self.add_extra(second)
+        self.second.update([second.pk])
+        self.first.update([first.pk])
+        for index in (self.first, self.second):
+            with mock.patch.object(CookableIndex, '_load') as load:
+                found = index.search([self.extra.pk], 10)
+            load.assert_not_called()
+            self.assertCountEqual([pk for _, _, pk in found],
+                                  [first.pk, second.pk])
+
+    def test_remove(self):
+        recipes = list(Recipe.objects.all()[:3])
+        for recipe in recipes:
+            self.add_extra(recipe)
+        self.first.update([recipe.pk for recipe in recipes])
+        RecipeIngredient.objects.filter(
+            recipe__in=recipes[:2], ingredient=self.extra).delete()
+        removed = recipes[0].pk
+        recipes[0].delete()
+        self.first.update([removed, recipes[1].pk])
+        self.assertEqual([pk for _, _, pk in self.first.search(
+            [self.extra.pk], 10)], [recipes[2].pk])
+        self.assertEqual(self.first.missing(removed, []), [])
+        self.assertNotIn(removed, [pk for _, _, pk in self.first.search(
+            [self.ingredients[0].pk], 100)])
+
+    def test_compact(self):
+        recipes = list(Recipe.objects.all())
+        for recipe in recipes:
+            self.add_extra(recipe)
+        with mock.patch('api.cookable.COMPACT_AFTER', len(recipes)):
+            self.first.update([recipe.pk for recipe in recipes[:-1]])
+            self.assertEqual(len(self.first._changed), len(recipes) - 1)
+            self.first.update([recipes[-1].pk])
+        self.assertEqual(self.first._changed, {})
+        self.assertEqual(len(self.first.search([self.extra.pk], 100)),
+                         len(recipes))
+        for recipe in recipes:
+            self.assertEqual(
+                self.first.missing(recipe.pk, [self.extra.pk]),
+                [ingredient.pk for ingredient in self.ingredients[:3]])
@@ -0,0 +1,75 @@
+from api.tests.test_query_counts import QueryCountTestCase, make_image
+from recipes.models import Favorite, Recipe
+from users.models import Follow, User
+
+
+class CounterTest(QueryCountTestCase):
+    """Счётчики верны при изменениях через API, ORM и каскадное удаление."""
+
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.get(username='author0')
+        self.recipe = self.author.recipes.first()
+
+    def assertCounter(self, obj, field, value):
+        obj.refresh_from_db(fields=[field])
+        self.assertEqual(getattr(obj, field), value)
+
+    def test_favorite(self):
+        url = f'/api/recipes/{self.recipe.pk}/favorite/'
+        self.assertCounter(self.recipe, 'favorites_count', 1)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertCounter(self.recipe, 'favorites_count', 0)
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertCounter(self.recipe, 'favorites_count', 1)
+        Favorite.objects.filter(recipe=self.recipe).delete()
+        self.assertCounter(self.recipe, 'favorites_count', 0)
+
+    def test_shopping_cart(self):
+        url = f'/api/recipes/{self.recipe.pk}/shopping_cart/'
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertCounter(self.recipe, 'in_carts_count', 0)
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertCounter(self.recipe, 'in_carts_count', 1)
+
+    def test_follow(self):
+        url = f'/api/users/{self.author.pk}/subscribe/'
+        self.assertCounter(self.author, 'followers_count', 1)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertCounter(self.author, 'followers_count', 0)
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertCounter(self.author, 'followers_count', 1)
+        # Удаление подписчика каскадно удаляет подписку.
+        self.user.delete()
+        self.assertCounter(self.author, 'followers_count', 0)
+
+    def test_recipe_create_and_delete(self):
+        self.assertCounter(self.author, 'recipes_count',
+                           self.recipes_per_author)
+        recipe = Recipe.objects.create(
+            author=self.author, name='Из админки', text='Описание',
+            cooking_time=5, image=make_image())
+        self.assertCounter(self.author, 'recipes_count',
+                           self.recipes_per_author + 1)
+        response = self.client.get('/api/users/subscriptions/')
+        self.assertEqual(
+            {user['id']: user['recipes_count']
+             for user in response.data['results']}[self.author.pk],
+            self.recipes_per_author + 1)
+        recipe.delete()
+        self.client.force_authenticate(self.author)
+        response = self.client.delete(f'/api/recipes/{self.recipe.pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertCounter(self.author, 'recipes_count',
+                           self.recipes_per_author - 1)
+
+    def test_bulk_unfollow(self):
+        # Пакетное удаление меняет счётчик один раз, а не и в сигналах.
+        authors = list(User.objects.filter(username__startswith='author'))
+        response = self.client.delete(
+            '/api/users/subscribe/',
+            {'ids': [author.pk for author in authors]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Follow.objects.filter(user=self.user).exists())
+        for author in authors:
+            self.assertCounter(author, 'followers_count', 0)
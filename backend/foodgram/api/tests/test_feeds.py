@@ -0,0 +1,103 @@
+import base64
+import io
+from unittest import mock
+
+from django.test import override_settings
+from PIL import Image
+
+from api.feeds import add_authors, get_feed_ids
+from api.tests.test_query_counts import QueryCountTestCase
+from recipes.models import FeedEntry, Recipe
+from users.models import User
+
+
+class FeedTest(QueryCountTestCase):
+    """Лента подписок: рассылка, дозаполнение и очистка записей."""
+
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.get(username='author0')
+        self.stranger = User.objects.create_user(
+            username='stranger', email='stranger@example.com')
+        self.stranger_recipes = [
+            self.add_recipe(self.stranger, f'Рецепт незнакомца {i}').pk
+            for i in range(3)
+        ]
+
+    def create_recipe(self, author):
+        buffer = io.BytesIO()
+        Image.new('RGB', (4, 4)).save(buffer, 'PNG')
+        self.client.force_authenticate(author)
+        with mock.patch('api.views.schedule_renditions'):
+            response = self.client.post('/api/recipes/', {
+                'ingredients': [{'id': self.ingredients[0].id, 'amount': 3}],
+                'tags': [self.tags[0].id],
+                'image': 'data:image/png;base64,'
+                         + base64.b64encode(buffer.getvalue()).decode(),
+                'name': 'Новый рецепт',
+                'text': 'Описание',
+                'cooking_time': 15,
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.client.force_authenticate(self.user)
+        return Recipe.objects.get(name='Новый рецепт').pk
+
+    def get_feed(self, **params):
+        response = self.client.get('/api/recipes/feed/', params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_fan_out_on_create(self):
+        recipe_id = self.create_recipe(self.author)
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.user, recipe_id=recipe_id).exists())
+        self.assertEqual(get_feed_ids(self.user, 10), [recipe_id])
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_pulled_on_read(self):
+        recipe_id = self.create_recipe(self.author)
+        self.assertFalse(Recipe.objects.get(pk=recipe_id).fanned_out)
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(get_feed_ids(self.user, 10), [recipe_id])
+
+    @override_settings(FEED_BACKFILL=2)
+    def test_backfill_on_subscribe(self):
+        url = f'/api/users/{self.stranger.pk}/subscribe/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(get_feed_ids(self.user, 10),
+                         self.stranger_recipes[:0:-1])
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(get_feed_ids(self.user, 10), [])
+
+    def test_add_authors_single_query(self):
+        authors = [self.stranger] + [
+            User.objects.create_user(
+                username=f'other{i}', email=f'other{i}@example.com')
+            for i in range(2)
+        ]
+        for author in authors[1:]:
+            self.add_recipe(author, f'Рецепт {author.username}')
+        # Рецепты всех авторов читаются одним запросом, вставка - одним.
+        with self.assertNumQueries(2):
+            add_authors(self.user.pk, [author.pk for author in authors])
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.user).count(),
+            len(self.stranger_recipes) + 2)
+
+    def test_recipe_deleted(self):
+        add_authors(self.user.pk, [self.stranger.pk])
+        Recipe.objects.get(pk=self.stranger_recipes[-1]).delete()
+        self.assertEqual(get_feed_ids(self.user, 10),
+                         self.stranger_recipes[-2::-1])
+
+    def test_before_pagination(self):
+        add_authors(self.user.pk, [self.stranger.pk])
+        response = self.get_feed(limit=2)
+        self.assertEqual([recipe['id'] for recipe in response.data['results']],
+                         self.stranger_recipes[:0:-1])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([recipe['id'] for recipe in response.data['results']],
+                         self.stranger_recipes[:1])
+        self.assertIsNone(response.data['next'])
+        response = self.client.get('/api/recipes/feed/', {'before': 'abc'})
+        self.assertEqual(response.status_code, 404)
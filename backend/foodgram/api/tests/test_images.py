@@ -0,0 +1,175 @@
+import base64
+import io
+from unittest import mock
+
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import (InMemoryUploadedFile,
+                                            TemporaryUploadedFile)
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+from rest_framework import serializers
+
+from api.images import decode_base64_image, generate_renditions
+from api.tests.test_query_counts import QueryCountTestCase
+from recipes.models import Recipe
+
+
+def make_png(size=(4, 4)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def make_data_uri(content, line_length=None):
+    encoded = base64.b64encode(content).decode()
+    if line_length:
+        encoded = '\r\n'.join(
+            encoded[i:i + line_length]
+            for i in range(0, len(encoded), line_length))
+    return 'data:image/png;base64,' + encoded
+
+
+class DecodeBase64ImageTest(SimpleTestCase):
+
+    def setUp(self):
+        self.content = make_png((32, 32))
+
+    def decode(self, data):
+        file = decode_base64_image(data)
+        self.addCleanup(file.close)
+        return file
+
+    def test_line_breaks(self):
+        # Порции нарочно не кратны 4 после удаления переводов строк.
+        with mock.patch('api.images.DECODE_CHUNK', 30):
+            file = self.decode(make_data_uri(self.content, line_length=76))
+            self.assertEqual(file.read(), self.content)
+            plain = self.decode(make_data_uri(self.content))
+        self.assertEqual(file.name, plain.name)
+
+    def test_content_addressed_name(self):
+        first = self.decode(make_data_uri(self.content))
+        second = self.decode(make_data_uri(self.content))
+        other = self.decode(make_data_uri(make_png((8, 8))))
+        self.assertEqual(first.name, second.name)
+        self.assertNotEqual(first.name, other.name)
+        self.assertTrue(first.name.endswith('.png'))
+
+    def test_temporary_file(self):
+        with override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=10):
+            file = self.decode(make_data_uri(self.content))
+        self.assertIsInstance(file, TemporaryUploadedFile)
+        self.assertEqual(file.size, len(self.content))
+        with open(file.temporary_file_path(), 'rb') as saved:
+            self.assertEqual(saved.read(), self.content)
+        file = self.decode(make_data_uri(self.content))
+        self.assertIsInstance(file, InMemoryUploadedFile)
+
+    def test_size_limit(self):
+        with override_settings(MAX_IMAGE_SIZE=len(self.content) - 1):
+            with self.assertRaises(serializers.ValidationError):
+                decode_base64_image(make_data_uri(self.content))
+        with override_settings(MAX_IMAGE_SIZE=len(self.content)):
+            self.decode(make_data_uri(self.content))
+
+    def test_invalid(self):
+        for data in ('data:image/png,abc',
+                     'data:image/svg;base64,PHN2Zz4=',
+                     'data:image/png;base64,a$bc',
+                     'data:image/png;base64,abcde'):
+            with self.subTest(data=data):
+                with self.assertRaises(serializers.ValidationError):
+                    decode_base64_image(data)
+
+
+class RecipeImageUploadTest(QueryCountTestCase):
+
+    def get_payload(self, image):
+        return {
+            'ingredients': [{'id': self.ingredients[0].id, 'amount': 3}],
+            'tags': [self.tags[0].id],
+            'image': image,
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 15,
+        }
+
+    def post(self, image):
+        with mock.patch('api.views.schedule_renditions'):
+            return self.client.post(
+                '/api/recipes/', self.get_payload(image), format='json')
+
+    @override_settings(MAX_IMAGE_PIXELS=15)
+    def test_pixel_limit(self):
+        response = self.post(make_data_uri(make_png((4, 4))))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+
+    def test_line_breaks(self):
+        response = self.post(make_data_uri(make_png(), line_length=76))
+        self.assertEqual(response.status_code, 201)
+
+    @override_settings(MAX_RECIPE_REQUEST_SIZE=1024)
+    def test_request_too_large(self):
+        # Запрос отклоняется по длине до разбора тела.
+        response = self.post(make_data_uri(b'0' * 1024))
+        self.assertEqual(response.status_code, 413)
+
+
+class RenditionTest(QueryCountTestCase):
+    """Готовность версий хранится в рецепте, а не проверяется в хранилище."""
+
+    def setUp(self):
+        super().setUp()
+        # Генерация закрывает соединения своего потока, а в тестах
+        # она выполняется в потоке тестовой транзакции.
+        patcher = mock.patch('api.images.connections')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_renditions(self, recipe):
+        with mock.patch.object(FileSystemStorage, 'exists') as exists:
+            response = self.client.get(f'/api/recipes/{recipe.pk}/')
+        exists.assert_not_called()
+        return response.data['image_renditions']
+
+    def post(self, content):
+        with mock.patch('api.views.schedule_renditions'):
+            response = self.client.post('/api/recipes/', {
+                'ingredients': [{'id': self.ingredients[0].id, 'amount': 3}],
+                'tags': [self.tags[0].id],
+                'image': make_data_uri(content),
+                'name': 'Новый рецепт',
+                'text': 'Описание',
+                'cooking_time': 15,
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return Recipe.objects.filter(name='Новый рецепт').latest('id')
+
+    def test_ready_after_generation(self):
+        recipe = Recipe.objects.first()
+        renditions = self.get_renditions(recipe)
+        self.assertTrue(renditions['thumbnail'].endswith(recipe.image.url))
+        generate_renditions(Recipe, recipe.image.name)
+        renditions = self.get_renditions(recipe)
+        self.assertTrue(renditions['thumbnail'].endswith('_thumbnail.webp'))
+        with mock.patch.object(FileSystemStorage, 'exists') as exists:
+            response = self.client.get('/api/users/subscriptions/')
+        exists.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+
+    def test_deduplicated_upload(self):
+        content = make_png((16, 16))
+        first = self.post(content)
+        generate_renditions(Recipe, first.image.name)
+        second = self.post(content)
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertNotEqual(second.renditions_image, second.image.name)
+        # Версии уже есть: рецепт только отмечается, файлы не пересоздаются.
+        with mock.patch.object(FileSystemStorage, 'save') as save:
+            generate_renditions(Recipe, second.image.name)
+        save.assert_not_called()
+        second.refresh_from_db()
+        self.assertEqual(second.renditions_image, second.image.name)
+        self.assertTrue(
+            self.get_renditions(second)['full'].endswith('_full.webp'))
@@ -0,0 +1,42 @@
+from api.tests.test_query_counts import QueryCountTestCase
+from recipes.models import Recipe
+from users.models import User
+
+
+class RecipeCursorPaginationTest(QueryCountTestCase):
+
+    def get_page(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def ids(self, page):
+        return [recipe['id'] for recipe in page['results']]
+
+    def test_pages_while_inserting(self):
+        expected = list(Recipe.objects.order_by('-id').values_list(
+            'id', flat=True))
+        page = self.get_page('/api/recipes/',
+                             {'pagination': 'cursor', 'limit': 5})
+        self.assertIsNone(page['previous'])
+        seen = self.ids(page)
+        author = User.objects.get(username='author0')
+        while page['next']:
+            # Новые рецепты попадают в начало и не сдвигают страницы.
+            self.add_recipe(author, f'Новый рецепт {len(seen)}')
+            page = self.get_page(page['next'])
+            seen += self.ids(page)
+        self.assertEqual(seen, expected)
+
+    def test_previous_link(self):
+        first = self.get_page('/api/recipes/',
+                              {'pagination': 'cursor', 'limit': 5})
+        second = self.get_page(first['next'])
+        self.assertEqual(self.ids(self.get_page(second['previous'])),
+                         self.ids(first))
+
+    def test_popular_ordering(self):
+        response = self.client.get('/api/recipes/', {
+            'pagination': 'cursor', 'ordering': 'popular'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ordering', response.data)
@@ -0,0 +1,116 @@
+import asyncio
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TransactionTestCase, override_settings
+from rest_framework.serializers import BaseSerializer
+
+from api.db_router import is_pinned_to_primary
+from api.middleware import (PrimaryPinMiddleware, QueryBudgetExceeded,
+                            QueryProfilingMiddleware)
+from api.tests.test_query_counts import LOCMEM_CACHES, QueryCountTestCase
+from api.threads import in_thread
+from recipes.models import RecipeQuerySet
+from users.models import User
+
+
+@override_settings(QUERY_PROFILING=True, QUERY_BUDGET_STRICT=True)
+class QueryBudgetTest(QueryCountTestCase):
+
+    def test_server_timing(self):
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('desc="5 queries"', response['Server-Timing'])
+        self.assertNotIn('nplusone', response['Server-Timing'])
+
+    @override_settings(QUERY_BUDGET_STRICT=False, CACHES={
+        **LOCMEM_CACHES,
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+        },
+    })
+    def test_database_cache_queries(self):
+        # Первый запрос создаёт версии в транзакции со SAVEPOINT.
+        self.client.get('/api/tags/')
+        response = self.client.get('/api/tags/')
+        self.assertIn('db;', response['Server-Timing'])
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+        self.assertIn('dbcache;', response['Server-Timing'])
+
+    def test_serializer_time(self):
+        data = BaseSerializer.data
+        response = self.client.get('/api/recipes/')
+        self.assertIs(BaseSerializer.data, data)
+        serialize = response['Server-Timing'].split(', ')[1]
+        self.assertGreater(float(serialize.split('=')[1]), 0)
+
+    def test_budget_met(self):
+        for url in ('/api/recipes/', '/api/users/subscriptions/'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_budget_exceeded(self):
+        with override_settings(QUERY_BUDGETS={'recipes-list': 4}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/api/recipes/')
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_budget_exceeded_warning(self):
+        with override_settings(QUERY_BUDGETS={'recipes-list': 4}):
+            with self.assertLogs('api.middleware', 'WARNING') as logs:
+                response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('recipes-list: выполнено 5 запросов', logs.output[0])
+
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_n_plus_one(self):
+        # Без аннотаций флагов сериализатор проверяет каждый рецепт
+        # отдельным запросом.
+        def without_flags(queryset, user):
+            return queryset.select_related('author')
+
+        with mock.patch.object(RecipeQuerySet, 'with_user_flags',
+                               without_flags):
+            with self.assertLogs('api.middleware', 'WARNING') as logs:
+                response = self.client.get('/api/recipes/')
+        self.assertIn('nplusone;', response['Server-Timing'])
+        self.assertTrue(any('возможный N+1' in line for line in logs.output))
+        self.assertIn('при бюджете 8', logs.output[-1])
+
+
+@override_settings(QUERY_PROFILING=True, CACHES=LOCMEM_CACHES)
+class AsyncMiddlewareTest(TransactionTestCase):
+    """Под ASGI цепочка middleware остаётся асинхронной."""
+
+    def test_queries_from_threads(self):
+        def query():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+
+        async def view(request):
+            await asyncio.gather(in_thread(query)(), in_thread(query)())
+            return HttpResponse()
+
+        middleware = QueryProfilingMiddleware(view)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(RequestFactory().get('/'))
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+
+    @override_settings(DATABASE_REPLICAS=['default'])
+    def test_primary_pin(self):
+        user = User.objects.create_user(
+            username='writer', email='writer@example.com')
+
+        async def view(request):
+            return HttpResponse(status=201)
+
+        middleware = PrimaryPinMiddleware(view)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        request = RequestFactory().post('/')
+        request.user = user
+        async_to_sync(middleware)(request)
+        self.assertTrue(is_pinned_to_primary(user.id))
@@ -0,0 +1,218 @@
+import base64
+import io
+import shutil
+import tempfile
+
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Follow, User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+# Кеш в памяти процесса: число запросов считается только по ORM,
+# без обращений к кешу в базе данных.
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests-default',
+    },
+    'recipes': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests-recipes',
+    },
+}
+
+
+def make_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (4, 4)).save(buffer, 'PNG')
+    return SimpleUploadedFile('image.png', buffer.getvalue())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CACHES=LOCMEM_CACHES)
+class QueryCountTestCase(TestCase):
+    """Авторы с рецептами, подписками, избранным и списком покупок."""
+
+    authors_count = 3
+    recipes_per_author = 4
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com')
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {i}', color=f'#00000{i}',
+                               slug=f'tag-{i}')
+            for i in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {i}',
+                                      measurement_unit='г')
+            for i in range(5)
+        ]
+        for i in range(cls.authors_count):
+            cls.add_author(f'author{i}')
+
+    @classmethod
+    def add_author(cls, username):
+        author = User.objects.create_user(
+            username=username, email=f'{username}@example.com')
+        Follow.objects.create(user=cls.user, following=author)
+        for i in range(cls.recipes_per_author):
+            cls.add_recipe(author, f'Рецепт {username} {i}')
+        return author
+
+    @classmethod
+    def add_recipe(cls, author, name):
+        recipe = Recipe.objects.create(
+            author=author, name=name, text='Описание', cooking_time=10,
+            image=make_image())
+        recipe.tags.set(cls.tags[:2])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=2)
+            for ingredient in cls.ingredients[:3]
+        )
+        Favorite.objects.create(user=cls.user, recipe=recipe)
+        ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        return recipe
+
+    def setUp(self):
+        for alias in LOCMEM_CACHES:
+            caches[alias].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class RecipeReadQueriesTest(QueryCountTestCase):
+    """Число запросов чтения не зависит от размера страницы."""
+
+    def test_recipe_list(self):
+        with self.assertNumQueries(5):
+            response = self.client.get('/api/recipes/', {'limit': 6})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertTrue(all(
+            recipe['is_favorited'] and recipe['is_in_shopping_cart']
+            and recipe['author']['is_subscribed']
+            for recipe in response.data['results']
+        ))
+
+    def test_recipe_list_page_size(self):
+        with self.assertNumQueries(5):
+            self.client.get('/api/recipes/', {'limit': 2})
+        with self.assertNumQueries(5):
+            self.client.get('/api/recipes/', {'limit': 12})
+
+    def test_recipe_list_anonymous(self):
+        self.client.force_authenticate(None)
+        with self.assertNumQueries(5):
+            response = self.client.get('/api/recipes/')
+        self.assertFalse(response.data['results'][0]['is_favorited'])
+
+    def test_recipe_detail(self):
+        recipe = Recipe.objects.latest('id')
+        with self.assertNumQueries(4):
+            response = self.client.get(f'/api/recipes/{recipe.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_favorited'])
+
+    def test_subscriptions(self):
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/users/subscriptions/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), self.authors_count)
+
+    def test_subscriptions_more_authors(self):
+        for i in range(3):
+            self.add_author(f'extra{i}')
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/users/subscriptions/')
+        self.assertEqual(len(response.data['results']), 6)
+
+    def test_subscriptions_recipes_limit(self):
+        # Превью - последние рецепты автора, как в индексе (author, -id).
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                '/api/users/subscriptions/', {'recipes_limit': 2})
+        for user in response.data['results']:
+            expected = Recipe.objects.filter(
+                author_id=user['id']).order_by('-id')[:2]
+            self.assertEqual([recipe['id'] for recipe in user['recipes']],
+                             [recipe.id for recipe in expected])
+
+
+class RecipeWriteQueriesTest(QueryCountTestCase):
+    """Ингредиенты и теги рецепта проверяются одним запросом на модель."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ещё ингредиент {i}', measurement_unit='г')
+            for i in range(40)
+        )
+        cls.ingredients = list(Ingredient.objects.order_by('id'))
+
+    def get_payload(self, ingredients):
+        buffer = io.BytesIO()
+        Image.new('RGB', (4, 4)).save(buffer, 'PNG')
+        return {
+            'ingredients': [{'id': ingredient.id, 'amount': 3}
+                            for ingredient in ingredients],
+            'tags': [tag.id for tag in self.tags],
+            'image': 'data:image/png;base64,'
+                     + base64.b64encode(buffer.getvalue()).decode(),
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 15,
+        }
+
+    def test_create(self):
+        for count in (2, 40):
+            with self.subTest(ingredients=count):
+                with self.assertNumQueries(13):
+                    response = self.client.post(
+                        '/api/recipes/',
+                        self.get_payload(self.ingredients[:count]),
+                        format='json')
+                self.assertEqual(response.status_code, 201)
+                recipe = Recipe.objects.latest('id')
+                self.assertEqual(recipe.ingredients.count(), count)
+
+    def test_update(self):
+        author = User.objects.get(username='author0')
+        self.client.force_authenticate(author)
+        recipes = author.recipes.all()[:2]
+        for recipe, count in zip(recipes, (2, 40)):
+            with self.subTest(ingredients=count):
+                # Корзины, индексы поиска и готовности сбрасываются после
+                # фиксации транзакции и в этот счёт не входят.
+                with self.assertNumQueries(17):
+                    response = self.client.patch(
+                        f'/api/recipes/{recipe.id}/',
+                        self.get_payload(self.ingredients[-count:]),
+                        format='json')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(recipe.ingredients.count(), count)
+
+    def test_unknown_ingredient(self):
+        ingredients = self.ingredients[:2]
+        payload = self.get_payload(ingredients)
+        payload['ingredients'].append({'id': 10 ** 6, 'amount': 1})
+        with self.assertNumQueries(2):
+            response = self.client.post('/api/recipes/', payload,
+                                        format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['ingredients'][:2], [{}, {}])
+        self.assertIn('id', response.data['ingredients'][2])
@@ -0,0 +1,23 @@
+from api.recommendations import CoOccurrence, load_interactions
+from api.tests.test_query_counts import QueryCountTestCase
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+
+class RecommendationsTest(QueryCountTestCase):
+
+    def test_similar_invalid_pk(self):
+        response = self.client.get('/api/recipes/abc/similar/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_newest_interactions(self):
+        # Старый рецепт с большим id не вытесняет недавно добавленный.
+        old, new = Recipe.objects.order_by('-id')[:2]
+        user = self.user
+        Favorite.objects.filter(user=user).delete()
+        ShoppingCart.objects.filter(user=user).delete()
+        Favorite.objects.create(user=user, recipe=old)
+        Favorite.objects.create(user=user, recipe=new)
+        pairs = list(load_interactions(100))
+        self.assertEqual(pairs, [(user.id, old.id), (user.id, new.id)])
+        co_occurrence = CoOccurrence(pairs + [(user.id, 1)], 2)
+        self.assertCountEqual(co_occurrence.items, [new.id, 1])
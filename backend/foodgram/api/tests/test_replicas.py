@@ -0,0 +1,76 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.tests.test_query_counts import LOCMEM_CACHES, MEDIA_ROOT, make_image
+from recipes.models import Recipe
+from users.models import User
+
+REPLICA = 'test_replica'
+
+# Реплика - второе подключение к тестовой базе default: раннер создаёт
+# его до запуска тестов, поэтому псевдоним объявляется при импорте.
+settings.DATABASES.setdefault(REPLICA, {
+    **{key: value for key, value in settings.DATABASES['default'].items()
+       if key != 'TEST'},
+    'TEST': {'MIRROR': 'default'},
+})
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA], CACHES=LOCMEM_CACHES,
+                   MEDIA_ROOT=MEDIA_ROOT)
+class ReplicaRoutingTest(TransactionTestCase):
+    """
+    Чтения представлений идут на реплику, записи и чтения сразу после
+    записи - на основную базу. Данные фиксируются транзакциями, иначе
+    второе подключение их не увидит.
+    """
+
+    databases = {'default', REPLICA}
+
+    def setUp(self):
+        for alias in LOCMEM_CACHES:
+            caches[alias].clear()
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com')
+        self.recipe = Recipe.objects.create(
+            author=self.user, name='Рецепт', text='Описание',
+            cooking_time=10, image=make_image())
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def request(self, method, url):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = getattr(self.client, method)(url)
+        self.assertLess(response.status_code, 400)
+        self.response = response
+        return len(primary), len(replica)
+
+    def test_routing(self):
+        primary, replica = self.request('get', '/api/recipes/')
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+        self.assertEqual(self.response.data['count'], 1)
+
+        primary, replica = self.request(
+            'post', f'/api/recipes/{self.recipe.pk}/favorite/')
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+        # Сразу после записи пользователь читает с основной базы.
+        primary, replica = self.request(
+            'get', f'/api/recipes/{self.recipe.pk}/')
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+        self.assertTrue(self.response.data['is_favorited'])
+
+    def test_anonymous_reads_replica(self):
+        self.client.force_authenticate(None)
+        primary, replica = self.request(
+            'get', f'/api/recipes/{self.recipe.pk}/')
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
@@ -0,0 +1,123 @@
+import io
+import os
+import tempfile
+from unittest import mock, skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+
+from api.journal import append_journal
+from api.search import (INGREDIENTS_VERSION, SEARCH_JOURNAL,
+                        IngredientPrefixIndex, RecipeSearchIndex,
+                        reindex_recipes, search_recipes)
+from api.tests.test_query_counts import QueryCountTestCase
+from api.versions import bump_versions
+from recipes.models import Ingredient, Recipe
+
+
+class IngredientPrefixIndexTest(QueryCountTestCase):
+
+    def test_reload_on_version(self):
+        # Другой процесс видит только смену общей версии.
+        index = IngredientPrefixIndex()
+        self.assertEqual(index.search('соль', 10), ([], []))
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='Соль', measurement_unit='г')])
+        self.assertEqual(index.search('соль', 10), ([], []))
+        bump_versions([INGREDIENTS_VERSION])
+        salt = Ingredient.objects.get(name='Соль')
+        self.assertEqual(index.search('соль', 10), ([salt.pk], []))
+
+    def test_reload_after_import(self):
+        index = IngredientPrefixIndex()
+        self.assertEqual(index.search('перец', 10), ([], []))
+        with tempfile.NamedTemporaryFile(
+                'w', suffix='.csv', encoding='utf-8', delete=False) as file:
+            file.write('name,measurement_unit\nПерец,г\n')
+        self.addCleanup(os.remove, file.name)
+        call_command('import_csv', file.name, stdout=io.StringIO())
+        pepper = Ingredient.objects.get(name='Перец')
+        self.assertEqual(index.search('перец', 10), ([pepper.pk], []))
+
+
+class DeferredThread:
+    """Поток, который выполняется в join в потоке теста."""
+
+    def __init__(self, target, **kwargs):
+        self.target = target
+        self.done = False
+
+    def start(self):
+        pass
+
+    def join(self):
+        self.target()
+        self.done = True
+
+    def is_alive(self):
+        return not self.done
+
+
+class RecipeSearchIndexTest(QueryCountTestCase):
+    """Экземпляры индекса изображают разные процессы."""
+
+    def setUp(self):
+        super().setUp()
+        self.first = RecipeSearchIndex()
+        self.second = RecipeSearchIndex()
+        for index in (self.first, self.second):
+            self.assertEqual(index.search('борщ', 10), [])
+
+    def rename(self, recipe, name):
+        recipe.name = name
+        recipe.save(update_fields=['name'])
+
+    def test_update_from_other_process(self):
+        recipe = Recipe.objects.first()
+        self.rename(recipe, 'Борщ')
+        self.first.update([recipe.pk])
+        with mock.patch.object(RecipeSearchIndex, '_load') as load:
+            self.assertEqual(self.second.search('борщ', 10), [recipe.pk])
+        load.assert_not_called()
+
+    def test_concurrent_updates(self):
+        # Изменение, записанное другим процессом между загрузкой
+        # и собственным обновлением, не теряется.
+        first, second = Recipe.objects.all()[:2]
+        self.rename(first, 'Борщ')
+        self.rename(second, 'Борщ зелёный')
+        self.second.update([second.pk])
+        self.first.update([first.pk])
+        for index in (self.first, self.second):
+            self.assertCountEqual(index.search('борщ', 10),
+                                  [first.pk, second.pk])
+
+    def test_rebuild_in_background(self):
+        # В тестовой транзакции поток с отдельным соединением
+        # не увидел бы данных, поэтому построение идёт в потоке теста.
+        recipe = Recipe.objects.first()
+        self.rename(recipe, 'Борщ')
+        append_journal(SEARCH_JOURNAL)
+        with mock.patch('api.journal.Thread', DeferredThread), \
+                mock.patch('api.journal.connections'):
+            # До конца перестроения отвечает прежний индекс.
+            self.assertEqual(self.first.search('борщ', 10), [])
+            self.first._rebuild_thread.join()
+            self.assertEqual(self.first.search('борщ', 10), [recipe.pk])
+        self.assertEqual(self.first._position, 1)
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'Полнотекстовый поиск только на PostgreSQL')
+class PostgresRecipeSearchTest(QueryCountTestCase):
+
+    def test_rank(self):
+        first, second = Recipe.objects.all()[:2]
+        first.name = 'Борщ'
+        first.save(update_fields=['name'])
+        second.text = 'Как борщ, только зелёный'
+        second.save(update_fields=['text'])
+        reindex_recipes([first.pk, second.pk])
+        # Совпадение в названии весит больше, чем в описании.
+        self.assertEqual(search_recipes('борщи', 10), [first.pk, second.pk])
+        self.assertEqual(search_recipes('щи', 10), [])
@@ -0,0 +1,57 @@
+from unittest import mock
+
+from api.shopping_cart import get_cart_ingredients
+from api.tests.test_query_counts import QueryCountTestCase
+from recipes.models import Recipe, RecipeIngredient
+
+
+class CartInvalidationTest(QueryCountTestCase):
+    """Список покупок сбрасывается при любом изменении его строк."""
+
+    def assertCartReloaded(self):
+        with self.assertNumQueries(1):
+            return get_cart_ingredients(self.user)
+
+    def setUp(self):
+        super().setUp()
+        self.before = get_cart_ingredients(self.user)
+
+    def test_cached(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(get_cart_ingredients(self.user), self.before)
+
+    def test_ingredient_renamed(self):
+        ingredient = self.ingredients[0]
+        ingredient.name = 'Переименованный'
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient.save()
+        names = [name for name, _, _ in self.assertCartReloaded()]
+        self.assertIn('Переименованный', names)
+
+    def test_recipe_ingredients_changed(self):
+        recipe = Recipe.objects.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeIngredient.objects.filter(recipe=recipe).delete()
+        self.assertNotEqual(self.assertCartReloaded(), self.before)
+
+    def test_recipe_updated(self):
+        # Сериализатор меняет количества через bulk_update без сигналов.
+        author = Recipe.objects.first().author
+        recipe = author.recipes.first()
+        self.client.force_authenticate(author)
+        # Версии изображения строятся в пуле потоков, которому
+        # данные тестовой транзакции не видны.
+        with mock.patch('api.views.schedule_renditions'), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/recipes/{recipe.id}/',
+                {'ingredients': [{'id': self.ingredients[0].id,
+                                  'amount': 100}]},
+                format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(self.assertCartReloaded(), self.before)
+
+    def test_recipe_deleted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.first().delete()
+        self.assertNotEqual(self.assertCartReloaded(), self.before)
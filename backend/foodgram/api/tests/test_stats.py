@@ -0,0 +1,41 @@
+import os
+
+from api.connections import get_stats
+from api.recipe_cache import recipe_cache
+from api.tests.test_query_counts import QueryCountTestCase
+
+
+class ProcessStatsTest(QueryCountTestCase):
+
+    def test_recipe_cache_counters(self):
+        before = recipe_cache.get_stats()
+        with self.assertNumQueries(5):
+            self.client.get('/api/recipes/', {'limit': 6})
+        with self.assertNumQueries(5):
+            self.client.get('/api/recipes/', {'limit': 6})
+        after = recipe_cache.get_stats()
+        self.assertEqual(after['misses'] - before['misses'], 6)
+        self.assertEqual(after['hits'] - before['hits'], 6)
+
+    def test_endpoint(self):
+        self.assertEqual(self.client.get('/api/stats/').status_code, 403)
+        self.user.is_staff = True
+        response = self.client.get('/api/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['pid'], os.getpid())
+        self.assertEqual(response.data['recipe_cache'],
+                         recipe_cache.get_stats())
+        self.assertIn('db_connections', response.data)
+
+    def test_log(self):
+        with self.settings(STATS_LOG_SECONDS=0):
+            with self.assertLogs('api.stats', 'INFO') as logs:
+                self.client.get('/api/recipes/')
+        self.assertTrue(any(f'recipe_cache, pid {os.getpid()}' in line
+                            for line in logs.output))
+
+    def test_connection_counters(self):
+        before = get_stats()
+        self.client.get('/api/recipes/')
+        self.client.get('/api/recipes/')
+        self.assertEqual(get_stats()['reused'] - before['reused'], 2)
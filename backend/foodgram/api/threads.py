@@ -0,0 +1,36 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+
+from django.conf import settings
+from django.db import close_old_connections
+
+# Каждый поток держит своё соединение с базой, поэтому размер пула
+# ограничивает число соединений процесса.
+executor = ThreadPoolExecutor(max_workers=settings.ASYNC_DB_THREADS,
+                              thread_name_prefix='async-db')
+
+
+def in_thread(func):
+    """
+    Выполняет функцию с запросами к базе в потоке из пула, чтобы
+    такие вызовы шли параллельно: в Django 3.2 вызовы sync_to_async с
+    thread_sensitive=True от всех запросов делят один поток. Устаревшие
+    соединения потока закрываются, как в конце обычного запроса.
+    Функция видит копию контекста корутины: значения, установленные
+    в потоке, в корутину не возвращаются.
+    """
+    def run(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, partial(context.run, run, *args, **kwargs))
+    return wrapper
@@ -1,7 +1,11 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from api.views import (FavoriteAPIView, IngredientViewSet, RecipeViewSet,
+from api import async_views
+from api.views import (BulkFavoriteAPIView, BulkShoppingCartAPIView,
+                       BulkSubscriptionsAPIView, FavoriteAPIView,
+                       IngredientViewSet, ProcessStatsAPIView, RecipeViewSet,
                        ShoppingCartAPIView, SubscriptionsListAPIView,
                        TagViewSet, UserSubscriptionsAPIView)
 
@@ -15,6 +19,12 @@ router.register(r'recipes', RecipeViewSet,
                 basename='recipes')
 
 urlpatterns = [
+    path('recipes/favorite/',
+         BulkFavoriteAPIView.as_view()),
+    path('recipes/shopping_cart/',
+         BulkShoppingCartAPIView.as_view()),
+    path('users/subscribe/',
+         BulkSubscriptionsAPIView.as_view()),
     path('recipes/<int:recipe_id>/favorite/',
          FavoriteAPIView.as_view()),
     path('recipes/<int:recipe_id>/shopping_cart/',
@@ -22,8 +32,23 @@ urlpatterns = [
     path('users/<int:author_id>/subscribe/',
          UserSubscriptionsAPIView.as_view()),
     path('users/subscriptions/',
-         SubscriptionsListAPIView.as_view({'get': 'list'})),
+         SubscriptionsListAPIView.as_view({'get': 'list'}),
+         name='subscriptions-list'),
+    path('stats/', ProcessStatsAPIView.as_view(), name='stats'),
     path('auth/', include('djoser.urls.authtoken')),
     path('', include('djoser.urls')),
     path('', include(router.urls)),
 ]
+
+if settings.ASYNC_VIEWS:
+    # Под ASGI горячие эндпоинты чтения обслуживаются асинхронно,
+    # имена совпадают с синхронными маршрутами и ключами QUERY_BUDGETS.
+    urlpatterns = [
+        path('recipes/', async_views.recipe_list, name='recipes-list'),
+        path('recipes/<int:pk>/', async_views.recipe_detail,
+             name='recipes-detail'),
+        path('ingredients/', async_views.ingredient_list,
+             name='ingredients-list'),
+        path('users/subscriptions/', async_views.subscription_list,
+             name='subscriptions-list'),
+    ] + urlpatterns
@@ -1,20 +1,118 @@
-import base64
-
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
 from django.shortcuts import get_object_or_404
-from django.core.files.base import ContentFile
+from rest_framework.relations import MANY_RELATION_KWARGS
 from rest_framework.response import Response
 from rest_framework import serializers, status
 
-from users.models import Follow
+from api.feeds import add_authors, remove_authors
+from api.images import check_image_pixels, decode_base64_image
+from api.shopping_cart import bump_cart_versions
+from api.versions import bump_versions
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.counters import change_counters, count_in_bulk
+from users.models import Follow, User
+
+# Модель связи: поле с объектом, модель объекта и его счётчик.
+BULK_RELATIONS = {
+    Favorite: ('recipe', Recipe, 'favorites_count'),
+    ShoppingCart: ('recipe', Recipe, 'in_carts_count'),
+    Follow: ('following', User, 'followers_count'),
+}
 
 
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-        return super().to_internal_value(data)
+        if not (isinstance(data, str) and data.startswith('data:image')):
+            return check_image_pixels(super().to_internal_value(data))
+        image = check_image_pixels(
+            super().to_internal_value(decode_base64_image(data)))
+        model_field = self.parent.Meta.model._meta.get_field(self.source)
+        name = model_field.generate_filename(None, image.name)
+        if model_field.storage.exists(name):
+            # Такое изображение уже загружено: ссылаемся на файл,
+            # не сохраняя копию.
+            image.close()
+            return name
+        return image
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField, которому можно заранее передать все ключи
+    списка: объекты загружаются одним запросом id__in, а каждый элемент
+    затем проверяется по загруженному словарю.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._objects = None
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+    def to_pk(self, data):
+        if isinstance(data, bool):
+            raise TypeError
+        try:
+            return self.get_queryset().model._meta.pk.to_python(data)
+        except DjangoValidationError:
+            raise ValueError
+
+    def preload(self, data):
+        pks = set()
+        for item in data:
+            try:
+                pks.add(self.to_pk(item))
+            except (TypeError, ValueError):
+                continue
+        self._objects = self.get_queryset().in_bulk(pks)
+
+    def to_internal_value(self, data):
+        if self._objects is None:
+            return super().to_internal_value(data)
+        try:
+            obj = self._objects.get(self.to_pk(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if obj is None:
+            self.fail('does_not_exist', pk_value=data)
+        return obj
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """Список ключей, проверяемый одним запросом с ошибками по индексам."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        data = list(data)
+        if not self.allow_empty and not data:
+            self.fail('empty')
+        self.child_relation.preload(data)
+        result = []
+        errors = {}
+        for index, item in enumerate(data):
+            try:
+                result.append(self.child_relation.to_internal_value(item))
+            except serializers.ValidationError as exc:
+                errors[index] = exc.detail
+        if errors:
+            raise serializers.ValidationError(errors)
+        return result
+
+
+def get_recipes_limit(request):
+    recipes_limit = request.query_params.get('recipes_limit')
+    try:
+        return int(recipes_limit)
+    except (TypeError, ValueError):
+        return None
 
 
 def create_object(user, recipe=None, author=None, model_class=None):
@@ -32,10 +130,13 @@ def create_object(user, recipe=None, author=None, model_class=None):
         if user == author:
             return Response({'detail': 'Нельзя подписаться на самого себя!'},
                             status=status.HTTP_400_BAD_REQUEST)
-        subscription, created = Follow.objects.get_or_create(
-            user=user,
-            following=author
-        )
+        with transaction.atomic():
+            subscription, created = Follow.objects.get_or_create(
+                user=user,
+                following=author
+            )
+            if created:
+                add_authors(user.pk, [author.pk])
         if created:
             return Response({'detail': 'Подписка успешно создана.'},
                             status=status.HTTP_201_CREATED)
@@ -55,6 +156,82 @@ def delete_object(user, recipe=None, author=None, model_class=None):
                         status=status.HTTP_204_NO_CONTENT)
     elif author:
         subscription = get_object_or_404(Follow, user=user, following=author)
-        subscription.delete()
+        with transaction.atomic():
+            subscription.delete()
+            remove_authors(user.pk, [author.pk])
         return Response({'detail': 'Подписка отменена.'},
                         status=status.HTTP_204_NO_CONTENT)
+
+
+def _lock_user(user):
+    # Пакетные изменения одного пользователя выполняются по очереди,
+    # чтобы счётчики не учитывали одну и ту же связь дважды.
+    User.objects.select_for_update().get(pk=user.pk)
+
+
+def _after_bulk_change(user, model_class):
+    bump_versions([f'user_flags:{user.id}'])
+    if model_class is ShoppingCart:
+        bump_cart_versions([user.id])
+
+
+def create_objects(user, ids, model_class):
+    """
+    Создаёт связи пользователя с объектами из списка ids одним
+    bulk_create и возвращает результат для каждого id.
+    """
+    field, target, counter = BULK_RELATIONS[model_class]
+    ids = list(dict.fromkeys(ids))
+    found = set(target.objects.filter(
+        pk__in=ids).values_list('pk', flat=True))
+    with transaction.atomic():
+        _lock_user(user)
+        existing = set(model_class.objects.filter(
+            user=user, **{f'{field}_id__in': found}
+        ).values_list(f'{field}_id', flat=True))
+        results = {}
+        for pk in ids:
+            if pk not in found:
+                results[pk] = 'not_found'
+            elif model_class is Follow and pk == user.pk:
+                results[pk] = 'self'
+            elif pk in existing:
+                results[pk] = 'exists'
+            else:
+                results[pk] = 'created'
+        created = [pk for pk, result in results.items()
+                   if result == 'created']
+        model_class.objects.bulk_create(
+            [model_class(user=user, **{f'{field}_id': pk})
+             for pk in created],
+            ignore_conflicts=True
+        )
+        change_counters(target, created, counter, 1)
+        if model_class is Follow:
+            add_authors(user.pk, created)
+    if created:
+        _after_bulk_change(user, model_class)
+    return [{'id': pk, 'status': result} for pk, result in results.items()]
+
+
+def delete_objects(user, ids, model_class):
+    """
+    Удаляет связи пользователя с объектами из списка ids одним
+    запросом и возвращает результат для каждого id.
+    """
+    field, target, counter = BULK_RELATIONS[model_class]
+    ids = list(dict.fromkeys(ids))
+    with transaction.atomic():
+        _lock_user(user)
+        queryset = model_class.objects.filter(
+            user=user, **{f'{field}_id__in': ids})
+        deleted = set(queryset.values_list(f'{field}_id', flat=True))
+        with count_in_bulk():
+            queryset.delete()
+        change_counters(target, deleted, counter, -1)
+        if model_class is Follow:
+            remove_authors(user.pk, deleted)
+    if deleted:
+        _after_bulk_change(user, model_class)
+    return [{'id': pk, 'status': 'deleted' if pk in deleted else 'absent'}
+            for pk in ids]
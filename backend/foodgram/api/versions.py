@@ -0,0 +1,44 @@
+import time
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'version:{name}'
+
+
+def get_versions(names):
+    """
+    Возвращает версии ресурсов в виде пар (токен, время изменения).
+    Отсутствующие версии создаются при первом обращении.
+    """
+    keys = {name: VERSION_KEY.format(name=name) for name in names}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for name, key in keys.items():
+        version = found.get(key)
+        if version is None:
+            cache.add(key, (uuid4().hex, time.time()), None)
+            version = cache.get(key)
+        versions[name] = version
+    return versions
+
+
+def bump_versions(names):
+    """Меняет версии ресурсов, делая устаревшими всё, что от них зависит."""
+    now = time.time()
+    cache.set_many(
+        {VERSION_KEY.format(name=name): (uuid4().hex, now) for name in names},
+        None
+    )
+
+
+def bump_versions_on_commit(names):
+    """
+    Меняет версии сразу и ещё раз после фиксации транзакции: другой
+    процесс мог между ними прочитать старые строки и сохранить ответ
+    под новой версией.
+    """
+    names = list(names)
+    bump_versions(names)
+    transaction.on_commit(lambda: bump_versions(names))
@@ -1,29 +1,56 @@
-from django.db.models import Sum
-from django.shortcuts import HttpResponse, get_object_or_404
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (BooleanField, OuterRef, Prefetch, Subquery,
+                              Value)
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import mixins, views, viewsets
+from rest_framework import mixins, status, views, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.permissions import (SAFE_METHODS, IsAdminUser,
+                                        IsAuthenticated)
+from rest_framework.response import Response
 
+from api.cookable import cookable_index
+from api.feeds import fan_out, is_fanout_author
 from api.filters import IngredientFilter
+from api.images import schedule_renditions
+from api.mixins import ConditionalGetMixin, ReplicaReadMixin
+from api.pagination import (CustomPagination, FeedPagination,
+                            RecipePagination)
+from api.parsers import RecipeJSONParser
 from api.permissions import IsAdminAuthorOrReadOnly, IsAdminReadOnly
-from api.serializers import (IngredientSerializer, RecipeCreateSerializer,
+from api.recommendations import get_recommended_ids, get_similar_ids
+from api.search import search_recipes
+from api.serializers import (BulkIdsSerializer, CookableQuerySerializer,
+                             IngredientSerializer, RecipeCreateSerializer,
                              RecipeSerializer, SubscribedUserSerializer,
                              TagSerializer)
-from recipes.models import (Ingredient, Recipe, RecipeIngredient, Tag,
-                            Favorite, ShoppingCart)
-from users.models import User
-from api.utils import create_object, delete_object
+from api.shopping_cart import EXPORTERS, get_cart_ingredients
+from api.stats import get_process_stats
+from recipes.models import (Ingredient, Recipe, Tag, Favorite,
+                            ShoppingCart)
+from users.models import Follow, User
+from api.utils import (create_object, create_objects, delete_object,
+                       delete_objects, get_recipes_limit)
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(ReplicaReadMixin, ConditionalGetMixin,
+                 viewsets.ModelViewSet):
+    list_version_names = ('tags',)
+    detail_version_names = ('tags',)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAdminReadOnly,)
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(ReplicaReadMixin, ConditionalGetMixin,
+                        viewsets.ModelViewSet):
+    list_version_names = ('ingredients',)
+    detail_version_names = ('ingredients',)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (IsAdminReadOnly,)
@@ -32,20 +59,34 @@ class IngredientViewSet(viewsets.ModelViewSet):
     filterset_class = IngredientFilter
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ReplicaReadMixin, ConditionalGetMixin,
+                    viewsets.ModelViewSet):
+    detail_version_names = ('recipe:{pk}', 'tags', 'ingredients')
+    vary_by_user = True
+    lookup_value_regex = r'\d+'
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     permission_classes = (IsAdminAuthorOrReadOnly,)
+    pagination_class = RecipePagination
+    parser_classes = (RecipeJSONParser, FormParser, MultiPartParser)
+
+    # Асинхронные представления загружают теги, ингредиенты
+    # и флаги пользователя сами, параллельными запросами.
+    load_related = True
 
     def get_queryset(self):
-        recipes = Recipe.objects.prefetch_related(
-            'recipe_ingredients__ingredient', 'tags'
-        ).distinct().all()
+        if self.load_related:
+            recipes = Recipe.objects.with_user_flags(
+                self.request.user
+            ).prefetch_related(
+                'recipe_ingredients__ingredient', 'tags'
+            )
+        else:
+            recipes = Recipe.objects.select_related('author')
 
         tags = self.request.query_params.getlist('tags')
         if tags:
-            recipes = recipes.filter(
-                tags__slug__in=tags)
+            recipes = recipes.with_tags(tags)
 
         is_in_shopping_cart = self.request.query_params.get(
             'is_in_shopping_cart'
@@ -57,11 +98,11 @@ class RecipeViewSet(viewsets.ModelViewSet):
             recipes = recipes.filter(author_id=author_id)
         if self.request.user.is_authenticated:
             if is_in_shopping_cart:
-                recipes = recipes.filter(
-                    added_to_carts__user=self.request.user)
+                recipes = recipes.in_cart_of(self.request.user)
             if is_favorited:
-                recipes = recipes.filter(
-                    favorited_by_users__user=self.request.user)
+                recipes = recipes.favorited_by(self.request.user)
+        if self.request.query_params.get('ordering') == 'popular':
+            return recipes.order_by('-favorites_count', '-id')
         return recipes.order_by('-id')
 
     def get_serializer_class(self):
@@ -70,45 +111,150 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return RecipeCreateSerializer
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        with transaction.atomic():
+            serializer.save(author=self.request.user,
+                            fanned_out=is_fanout_author(self.request.user))
+            fan_out(serializer.instance)
+            schedule_renditions(serializer.instance)
 
     @action(
         detail=False,
         url_path='download_shopping_cart',
-        methods=['get']
+        methods=['get'],
+        permission_classes=(IsAuthenticated,)
     )
     def download_shopping_cart(self, request):
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__added_to_carts__user=request.user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(
-            total_amount=Sum('amount')
-        ).order_by('ingredient__name')
-
-        shopping_list = ['Список покупок:\n']
-
-        for ingredient in ingredients:
-            name = ingredient['ingredient__name']
-            unit = ingredient['ingredient__measurement_unit']
-            amount = ingredient['total_amount']
-            shopping_list.append(f'\n {name} - {amount} {unit}')
-        shopping_list.append('\n\nFoodgram - Вкус момента, разделяемый миром!')
-        response = HttpResponse(shopping_list, content_type='text/plain')
+        file_format = request.query_params.get('file_format', 'txt')
+        exporter_class = EXPORTERS.get(file_format)
+        if exporter_class is None:
+            return Response(
+                {'detail': f'Неподдерживаемый формат: {file_format}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        exporter = exporter_class()
+        response = StreamingHttpResponse(
+            exporter.render(get_cart_ingredients(request.user)),
+            content_type=exporter.content_type
+        )
         response['Content-Disposition'] = (
-            'attachment; filename="shopping_cart.txt"'
+            f'attachment; filename="shopping_cart.{exporter.extension}"'
         )
         return response
 
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=(IsAuthenticated,)
+    )
+    def feed(self, request):
+        paginator = FeedPagination()
+        ids = paginator.paginate_feed(request.user, request)
+        serializer = self.get_serializer(
+            self.get_recipes_by_ids(ids), many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': 'Введите поисковый запрос.'})
+        paginator = CustomPagination()
+        ids = paginator.paginate_queryset(
+            search_recipes(query, settings.RECIPE_SEARCH_LIMIT),
+            request, view=self
+        )
+        serializer = self.get_serializer(
+            self.get_recipes_by_ids(ids), many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def cookable(self, request):
+        query = CookableQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        ingredient_ids = query.validated_data['ingredients']
+        paginator = CustomPagination()
+        ranked = paginator.paginate_queryset(
+            cookable_index.search(
+                ingredient_ids, settings.COOKABLE_LIMIT,
+                query.validated_data['min_coverage']
+            ),
+            request, view=self
+        )
+        serializer = self.get_serializer(
+            self.get_recipes_by_ids([pk for _, _, pk in ranked]), many=True)
+        coverages = {pk: coverage for coverage, _, pk in ranked}
+        return paginator.get_paginated_response([
+            {
+                **recipe,
+                'coverage': round(coverages[recipe['id']], 3),
+                'missing_ingredients': cookable_index.missing(
+                    recipe['id'], ingredient_ids),
+            }
+            for recipe in serializer.data
+        ])
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        ids = get_similar_ids(pk, settings.RECOMMENDATIONS_NEIGHBOURS)
+        if not ids:
+            get_object_or_404(Recipe, id=pk)
+        serializer = self.get_serializer(
+            self.get_recipes_by_ids(ids), many=True)
+        return Response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=(IsAuthenticated,)
+    )
+    def recommended(self, request):
+        paginator = CustomPagination()
+        ids = paginator.paginate_queryset(
+            get_recommended_ids(request.user, settings.RECOMMENDATIONS_LIMIT),
+            request, view=self
+        )
+        serializer = self.get_serializer(
+            self.get_recipes_by_ids(ids), many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    def get_recipes_by_ids(self, ids):
+        """Рецепты страницы в порядке ids с флагами пользователя."""
+        recipes = Recipe.objects.with_user_flags(
+            self.request.user
+        ).prefetch_related(
+            'recipe_ingredients__ingredient', 'tags'
+        ).in_bulk(ids)
+        return [recipes[pk] for pk in ids if pk in recipes]
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        schedule_renditions(serializer.instance)
+
 
-class SubscriptionsListAPIView(mixins.ListModelMixin,
+class SubscriptionsListAPIView(ReplicaReadMixin, mixins.ListModelMixin,
                                viewsets.GenericViewSet):
     serializer_class = SubscribedUserSerializer
     permission_classes = (IsAuthenticated,)
 
     def get_queryset(self):
-        return User.objects.filter(following__user=self.request.user)
+        # Превью - последние рецепты автора: порядок совпадает
+        # с индексом (author, -id), и подзапрос читает из него
+        # только recipes_limit строк на автора.
+        recipes = Recipe.objects.order_by('-id')
+        recipes_limit = get_recipes_limit(self.request)
+        if recipes_limit is not None:
+            recipes = recipes.filter(id__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).order_by('-id').values('id')[:max(recipes_limit, 0)]
+            ))
+        return User.objects.filter(
+            following__user=self.request.user
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='recipes_preview')
+        ).order_by('username')
 
 
 class UserSubscriptionsAPIView(views.APIView):
@@ -170,3 +316,49 @@ class ShoppingCartAPIView(views.APIView):
             recipe=recipe,
             model_class=ShoppingCart
         )
+
+
+class BulkRelationAPIView(views.APIView):
+    """
+    Пакетное добавление и удаление связей пользователя: принимает
+    список id и возвращает результат для каждого из них.
+    """
+    model_class = None
+
+    def get_ids(self, request):
+        serializer = BulkIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['ids']
+
+    def post(self, request):
+        results = create_objects(
+            request.user, self.get_ids(request), self.model_class)
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+    def delete(self, request):
+        results = delete_objects(
+            request.user, self.get_ids(request), self.model_class)
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+class BulkSubscriptionsAPIView(BulkRelationAPIView):
+    model_class = Follow
+
+
+class BulkFavoriteAPIView(BulkRelationAPIView):
+    model_class = Favorite
+
+
+class BulkShoppingCartAPIView(BulkRelationAPIView):
+    model_class = ShoppingCart
+
+
+class ProcessStatsAPIView(views.APIView):
+    """
+    Счётчики кэша рецептов и соединений с базой процесса, обработавшего
+    запрос: у каждого воркера gunicorn они свои.
+    """
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(get_process_stats())
@@ -1,6 +1,8 @@
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -36,6 +38,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.QueryProfilingMiddleware',
+    'api.middleware.PrimaryPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -76,9 +80,84 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'mypassword'),
         'HOST': os.getenv('DB_HOST', 'mycontainername'),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+    }
+}
+
+# Режим соединений: persistent - постоянные соединения с CONN_MAX_AGE,
+# pool - пул внутри процесса, pgbouncer - без серверных курсоров,
+# которые не работают в транзакционном режиме PgBouncer.
+DB_CONNECTION_MODE = os.getenv('DB_CONNECTION_MODE', 'persistent')
+DB_CONN_HEALTH_CHECKS = os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))
+if DB_CONNECTION_MODE == 'pool':
+    DATABASES['default']['ENGINE'] = 'api.db_pool'
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+elif DB_CONNECTION_MODE == 'pgbouncer':
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+# Реплики только для чтения: DB_REPLICAS - хосты через запятую,
+# для SQLite - пути к файлам баз. В тестах реплики указывают на default.
+DATABASE_REPLICAS = []
+for index, replica in enumerate(
+        filter(None, os.getenv('DB_REPLICAS', '').split(','))):
+    alias = f'replica_{index}'
+    location = ('NAME' if DATABASES['default']['ENGINE'].endswith('sqlite3')
+                else 'HOST')
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        location: replica.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['api.db_router.ReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+# Версии данных должны быть общими для всех воркеров, поэтому кэш
+# по умолчанию хранится в базе (таблицу создаёт команда
+# createcachetable), а в docker-compose - в memcached. Фрагменты
+# рецептов остаются в памяти процесса: их ключи содержат общие версии.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.db.DatabaseCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'django_cache'),
+    },
+    'recipes': {
+        'BACKEND': os.getenv(
+            'RECIPE_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('RECIPE_CACHE_LOCATION', 'recipes'),
     }
 }
+if 'memcached' not in CACHES['default']['BACKEND']:
+    # По умолчанию DatabaseCache и LocMemCache хранят 300 записей и при
+    # переполнении удаляют часть ключей независимо от срока, в том числе
+    # версии, журналы индексов и закрепления за основной базой.
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 1000000)),
+    }
+
+# Число воркеров gunicorn, он читает ту же переменную окружения.
+# С репликами закрепления за основной базой тоже хранятся в кэше и
+# должны быть видны всем воркерам и контейнерам бэкенда.
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 1))
+if ((WEB_CONCURRENCY > 1 or DATABASE_REPLICAS)
+        and CACHES['default']['BACKEND'].endswith('LocMemCache')):
+    raise ImproperlyConfigured(
+        'LocMemCache не разделяется между процессами: при '
+        'WEB_CONCURRENCY > 1 или репликах базы задайте общий CACHE_BACKEND'
+    )
 
 
 # Password validation
@@ -153,3 +232,75 @@ DJOSER = {
 EMPTY_VALUE = '-пусто-'
 MIN_VALUE = 1
 MAX_VALUE = 32000
+INGREDIENT_SEARCH_LIMIT = 50
+RECIPE_SEARCH_LIMIT = 1000
+COOKABLE_LIMIT = 1000
+COOKABLE_MAX_INGREDIENTS = 100
+BULK_MAX_IDS = 100
+RECIPE_CACHE_ALIAS = 'recipes'
+RECIPE_CACHE_TIMEOUT = 24 * 60 * 60
+MAX_IMAGE_SIZE = int(os.getenv('MAX_IMAGE_SIZE', 10 * 1024 * 1024))
+MAX_IMAGE_PIXELS = int(os.getenv('MAX_IMAGE_PIXELS', 40 * 1000 * 1000))
+# Тело запроса с рецептом: изображение в base64 и запас на остальные поля.
+MAX_RECIPE_REQUEST_SIZE = MAX_IMAGE_SIZE * 4 // 3 + 1024 * 1024
+ALLOWED_IMAGE_TYPES = ('jpeg', 'jpg', 'png', 'gif', 'webp')
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+# Рецепты авторов, у которых подписчиков больше FEED_FANOUT_LIMIT, не
+# рассылаются по лентам, а подмешиваются при чтении.
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 1000))
+FEED_BACKFILL = 50
+FEED_BATCH_SIZE = 1000
+RECOMMENDATIONS_NEIGHBOURS = 20
+# Рекомендации подбираются по последним рецептам пользователя
+# в избранном и списке покупок.
+RECOMMENDATIONS_RECENT_ITEMS = 50
+# При построении похожих рецептов от пользователя берутся не больше
+# стольких рецептов, чтобы число пар не росло квадратично.
+RECOMMENDATIONS_MAX_USER_ITEMS = 500
+RECOMMENDATIONS_LIMIT = 100
+RECOMMENDATIONS_BATCH_SIZE = 1000
+
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+ASYNC_DB_THREADS = int(os.getenv('ASYNC_DB_THREADS', 20))
+
+QUERY_PROFILING = os.getenv('QUERY_PROFILING', 'False') == 'True'
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', 'False') == 'True'
+QUERY_BUDGET_DEFAULT = None
+# Бюджеты запросов по имени представления (request.resolver_match).
+# Асинхронные представления читают флаги пользователя тремя
+# параллельными запросами вместо подзапросов, отсюда бюджет detail.
+QUERY_BUDGETS = {
+    'recipes-list': 8,
+    'recipes-detail': 7,
+    'recipes-download-shopping-cart': 3,
+    'recipes-feed': 7,
+    'recipes-search': 6,
+    'recipes-cookable': 6,
+    'recipes-similar': 6,
+    'recipes-recommended': 6,
+    'tags-list': 2,
+    'tags-detail': 2,
+    'ingredients-list': 3,
+    'ingredients-detail': 2,
+    'subscriptions-list': 5,
+}
+N_PLUS_ONE_THRESHOLD = 5
+
+# Как часто счётчики процесса (api.stats) пишутся в лог.
+STATS_LOG_SECONDS = int(os.getenv('STATS_LOG_SECONDS', 300))
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.stats': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
+SHOPPING_CART_CACHE_TIMEOUT = 60 * 60
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
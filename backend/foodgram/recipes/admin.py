@@ -56,7 +56,8 @@ class RecipeAdmin(admin.ModelAdmin):
     inlines = (RecipeIngredientInline, )
 
     def total_favorites(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
+        return obj.favorites_count
+    total_favorites.admin_order_field = 'favorites_count'
     total_favorites.short_description = 'Число добавлений рецепта в избранное'
 
 
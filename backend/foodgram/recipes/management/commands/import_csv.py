@@ -1,26 +1,110 @@
 import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
+from api.search import INGREDIENTS_VERSION
+from api.versions import bump_versions
 from recipes.models import Ingredient
 
 
+def read_csv(file):
+    for row in csv.DictReader(file):
+        yield row['name'], row['measurement_unit']
+
+
+def read_json(file):
+    for row in json.load(file):
+        yield row['name'], row['measurement_unit']
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
 class Command(BaseCommand):
-    help = 'Импорт данных из CSV-файла'
+    help = 'Импорт ингредиентов из CSV- или JSON-файла'
 
     def add_arguments(self, parser):
-        parser.add_argument('csv_file', help='Путь к CSV-файлу для импорта')
+        parser.add_argument('csv_file', help='Путь к файлу для импорта')
+        parser.add_argument(
+            '--format',
+            choices=READERS,
+            help='Формат файла, по умолчанию определяется по расширению'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Количество строк в одном INSERT'
+        )
+        parser.add_argument(
+            '--upsert',
+            action='store_true',
+            help=(
+                'Сверять каждую пачку с уже существующими ингредиентами '
+                'и вставлять только новые, с точным подсчётом'
+            )
+        )
 
     def handle(self, *args, **options):
-        csv_file_path = options['csv_file']
-
-        with open(csv_file_path, 'r') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                Ingredient.objects.create(
-                    name=row['name'],
-                    measurement_unit=row['measurement_unit']
+        path = Path(options['csv_file'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path.name}')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size должен быть положительным')
+
+        started = time.monotonic()
+        total = created = 0
+        with open(path, 'r', encoding='utf-8') as file, transaction.atomic():
+            rows = READERS[file_format](file)
+            while True:
+                chunk = list(islice(rows, options['chunk_size']))
+                if not chunk:
+                    break
+                if options['upsert']:
+                    created += self.upsert_chunk(chunk)
+                else:
+                    Ingredient.objects.bulk_create(
+                        [Ingredient(name=name, measurement_unit=unit)
+                         for name, unit in chunk],
+                        ignore_conflicts=True
+                    )
+                total += len(chunk)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'Обработано строк: {total} '
+                    f'({total / elapsed if elapsed else 0:.0f} строк/с)'
                 )
-        self.stdout.write(self.style.SUCCESS(
-            'Данные успешно импортированы в базу!')
+        # bulk_create не отправляет сигналы: версию ингредиентов, по
+        # которой процессы перечитывают кэши и индекс поиска, меняем сами.
+        bump_versions([INGREDIENTS_VERSION])
+
+        message = f'Данные успешно импортированы в базу! Строк: {total}'
+        if options['upsert']:
+            message += f', новых: {created}, уже было: {total - created}'
+        self.stdout.write(self.style.SUCCESS(message))
+
+    def upsert_chunk(self, chunk):
+        """
+        Вставляет только отсутствующие ингредиенты пачки.
+        Все поля ингредиента входят в уникальный ключ, поэтому
+        обновлять у совпавших строк нечего.
+        """
+        keys = set(chunk)
+        existing = set(Ingredient.objects.filter(
+            name__in={name for name, _ in keys}
+        ).values_list('name', 'measurement_unit'))
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name, measurement_unit=unit)
+             for name, unit in keys - existing],
+            ignore_conflicts=True
         )
+        return len(keys - existing)
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow, User
+
+
+def count_of(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            total=Count('pk')
+        ).values('total'),
+        output_field=IntegerField()
+    ), 0)
+
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'following'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчёт денормализованных счётчиков рецептов и пользователей, '
+        'например после загрузки данных через bulk_create, которая не '
+        'отправляет сигналов'
+    )
+
+    def handle(self, *args, **options):
+        for model, field, related_model, related_field in COUNTERS:
+            actual = count_of(related_model, related_field)
+            with transaction.atomic():
+                drifted = model.objects.annotate(
+                    actual=actual
+                ).filter(~Q(**{field: F('actual')})).values('pk')
+                fixed = model.objects.filter(
+                    pk__in=drifted
+                ).update(**{field: actual})
+            self.stdout.write(
+                f'{model._meta.model_name}.{field}: исправлено {fixed}')
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
@@ -0,0 +1,252 @@
+import io
+import random
+import time
+from itertools import accumulate, islice
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Follow, User
+
+SEED_PREFIX = 'seed'
+SEED_IMAGE = 'recipes/images/temp.jpeg'
+DEFAULT_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+# Показатель степени распределения Парето для числа подписок и избранного:
+# при 1.5 среднее равно трём минимальным значениям.
+PARETO_ALPHA = 1.5
+
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def zipf_weights(size, exponent):
+    """Накопленные веса закона Ципфа для random.choices."""
+    return list(accumulate(1 / rank ** exponent
+                           for rank in range(1, size + 1)))
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерация синтетических пользователей, подписок, рецептов, '
+        'избранного и списков покупок для нагрузочных замеров'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок пользователя'
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=30,
+            help='Среднее число рецептов в избранном'
+        )
+        parser.add_argument(
+            '--cart', type=int, default=5,
+            help='Среднее число рецептов в списке покупок'
+        )
+        parser.add_argument(
+            '--exponent',
+            type=float,
+            default=1.1,
+            help='Показатель закона Ципфа для популярности авторов и рецептов'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Количество строк в одной вставке'
+        )
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Не использовать COPY на PostgreSQL'
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size должен быть положительным')
+        if options['users'] < 1:
+            raise CommandError('--users должен быть положительным')
+        self.options = options
+        self.use_copy = (connection.vendor == 'postgresql'
+                         and not options['no_copy'])
+        if not Ingredient.objects.exists():
+            call_command(
+                'import_csv',
+                str(settings.BASE_DIR / 'data' / 'ingredients.csv'),
+                stdout=self.stdout
+            )
+        with transaction.atomic():
+            user_ids = self.create_users()
+            recipe_ids = self.create_recipes(user_ids)
+            self.create_follows(user_ids)
+            self.create_user_recipes(
+                Favorite, user_ids, recipe_ids, options['favorites'])
+            self.create_user_recipes(
+                ShoppingCart, user_ids, recipe_ids, options['cart'])
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(
+                        no_style(), [User, Recipe]):
+                    cursor.execute(sql)
+        call_command('reconcile_counters', stdout=self.stdout)
+        call_command('rebuild_feeds', stdout=self.stdout)
+        call_command('reindex_recipes', stdout=self.stdout)
+        call_command('build_recommendations', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS('Данные сгенерированы'))
+
+    def random(self, name):
+        """Отдельный генератор на каждую таблицу: изменение объёма одной
+        таблицы не меняет содержимое остальных."""
+        return random.Random(f'{self.options["seed"]}:{name}')
+
+    def get_start_id(self, model):
+        last = model.objects.order_by('-pk').values_list(
+            'pk', flat=True).first()
+        return (last or 0) + 1
+
+    def write(self, model, objects, total, title):
+        """Вставляет объекты пачками, на PostgreSQL - через COPY."""
+        started = time.monotonic()
+        written = 0
+        objects = iter(objects)
+        while True:
+            chunk = list(islice(objects, self.options['chunk_size']))
+            if not chunk:
+                break
+            if self.use_copy:
+                self.copy(model, chunk)
+            else:
+                model.objects.bulk_create(chunk)
+            written += len(chunk)
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'{title}: {written}/{total or written} '
+                f'({written / elapsed if elapsed else 0:.0f} строк/с)'
+            )
+
+    def copy(self, model, chunk):
+        fields = [
+            field for field in model._meta.concrete_fields
+            if not (field.primary_key and chunk[0].pk is None)
+        ]
+        buffer = io.StringIO()
+        for obj in chunk:
+            buffer.write('\t'.join(
+                copy_value(field.get_db_prep_save(
+                    getattr(obj, field.attname), connection))
+                for field in fields
+            ))
+            buffer.write('\n')
+        buffer.seek(0)
+        columns = ', '.join(
+            connection.ops.quote_name(field.column) for field in fields)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {connection.ops.quote_name(model._meta.db_table)} '
+                f'({columns}) FROM STDIN',
+                buffer
+            )
+
+    def create_users(self):
+        start = self.get_start_id(User)
+        user_ids = range(start, start + self.options['users'])
+        joined = timezone.now()
+        self.write(User, (
+            User(id=pk, username=f'{SEED_PREFIX}_{pk}',
+                 email=f'{SEED_PREFIX}_{pk}@example.com',
+                 first_name='Пользователь', last_name=str(pk),
+                 password='!', date_joined=joined)
+            for pk in user_ids
+        ), len(user_ids), 'Пользователи')
+        return user_ids
+
+    def create_recipes(self, user_ids):
+        rng = self.random('recipes')
+        start = self.get_start_id(Recipe)
+        recipe_ids = range(start, start + self.options['recipes'])
+        authors = zipf_weights(len(user_ids), self.options['exponent'])
+        self.write(Recipe, (
+            Recipe(id=pk, author_id=author_id, name=f'Рецепт {pk}',
+                   text='Синтетический рецепт', image=SEED_IMAGE,
+                   cooking_time=rng.randint(5, 180))
+            for pk, author_id in zip(recipe_ids, rng.choices(
+                user_ids, cum_weights=authors, k=len(recipe_ids)))
+        ), len(recipe_ids), 'Рецепты')
+
+        tags = list(Tag.objects.values_list('id', flat=True))
+        if not tags:
+            tags = [Tag.objects.create(name=name, color=color, slug=slug).id
+                    for name, color, slug in DEFAULT_TAGS]
+        ingredients = list(Ingredient.objects.values_list('id', flat=True))
+
+        def recipe_ingredients():
+            for pk in recipe_ids:
+                count = max(1, min(25, round(rng.gauss(9, 3))))
+                for ingredient_id in rng.sample(
+                        ingredients, min(count, len(ingredients))):
+                    yield RecipeIngredient(recipe_id=pk,
+                                           ingredient_id=ingredient_id,
+                                           amount=rng.randint(1, 500))
+
+        def recipe_tags():
+            for pk in recipe_ids:
+                for tag_id in rng.sample(tags, rng.randint(1, len(tags))):
+                    yield Recipe.tags.through(recipe_id=pk, tag_id=tag_id)
+
+        self.write(RecipeIngredient, recipe_ingredients(), None,
+                   'Ингредиенты рецептов')
+        self.write(Recipe.tags.through, recipe_tags(), None, 'Теги рецептов')
+        return recipe_ids
+
+    def degree(self, rng, mean, limit):
+        """Степень вершины по закону Парето с заданным средним."""
+        minimum = mean * (PARETO_ALPHA - 1) / PARETO_ALPHA
+        return min(limit, int(minimum * rng.paretovariate(PARETO_ALPHA)))
+
+    def create_follows(self, user_ids):
+        rng = self.random('follows')
+        weights = zipf_weights(len(user_ids), self.options['exponent'])
+
+        def follows():
+            for user_id in user_ids:
+                degree = self.degree(
+                    rng, self.options['follows'], len(user_ids) - 1)
+                authors = set(rng.choices(
+                    user_ids, cum_weights=weights, k=degree))
+                authors.discard(user_id)
+                for author_id in sorted(authors):
+                    yield Follow(user_id=user_id, following_id=author_id)
+
+        self.write(Follow, follows(), None, 'Подписки')
+
+    def create_user_recipes(self, model, user_ids, recipe_ids, mean):
+        if not recipe_ids or not mean:
+            return
+        rng = self.random(model._meta.model_name)
+        weights = zipf_weights(len(recipe_ids), self.options['exponent'])
+
+        def rows():
+            for user_id in user_ids:
+                degree = self.degree(rng, mean, len(recipe_ids))
+                for recipe_id in sorted(set(rng.choices(
+                        recipe_ids, cum_weights=weights, k=degree))):
+                    yield model(user_id=user_id, recipe_id=recipe_id)
+
+        self.write(model, rows(), None, model._meta.verbose_name_plural)
@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+
+def remove_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    kept = {}
+    duplicates = {}
+    for pk, name, unit in Ingredient.objects.order_by('pk').values_list(
+            'pk', 'name', 'measurement_unit'):
+        if (name, unit) in kept:
+            duplicates[pk] = kept[(name, unit)]
+        else:
+            kept[(name, unit)] = pk
+    for duplicate_pk, kept_pk in duplicates.items():
+        RecipeIngredient.objects.filter(
+            ingredient_id=duplicate_pk
+        ).update(ingredient_id=kept_pk)
+    Ingredient.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+CREATE_INDEX = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm;'
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_trgm '
+    'ON recipes_ingredient USING gin (UPPER(name) gin_trgm_ops);'
+)
+DROP_INDEX = 'DROP INDEX IF EXISTS recipes_ingredient_name_trgm;'
+
+
+def create_trgm_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_INDEX)
+
+
+def drop_trgm_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_ingredient_unique_ingredient'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trgm_index, drop_trgm_index),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Индекс (tag_id, recipe_id) для полусоединения по тегам. Пары
+    (recipe_id, tag_id), (user_id, recipe_id) у избранного и списка
+    покупок уже покрыты индексами ограничений уникальности.
+    """
+
+    dependencies = [
+        ('recipes', '0005_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX recipes_recipe_tags_tag_recipe_idx '
+            'ON recipes_recipe_tags (tag_id, recipe_id);',
+            'DROP INDEX recipes_recipe_tags_tag_recipe_idx;'
+        ),
+    ]
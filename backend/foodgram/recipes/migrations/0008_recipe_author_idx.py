@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Индекс (author_id, id DESC) для последних рецептов автора: заполнение
+    лент при подписке, фильтр author в списке рецептов и превью рецептов
+    в подписках.
+    """
+
+    dependencies = [
+        ('recipes', '0007_feed'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-id'], name='recipe_author_idx'),
+        ),
+    ]
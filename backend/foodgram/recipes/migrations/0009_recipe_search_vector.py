@@ -0,0 +1,49 @@
+from django.db import migrations
+
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian', recipes_recipe.name), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(("
+    "SELECT string_agg(i.name, ' ') FROM recipes_recipeingredient ri "
+    "JOIN recipes_ingredient i ON i.id = ri.ingredient_id "
+    "WHERE ri.recipe_id = recipes_recipe.id), '')), 'B') || "
+    "setweight(to_tsvector('russian', recipes_recipe.text), 'C')"
+)
+CREATE_COLUMN = (
+    'ALTER TABLE recipes_recipe '
+    'ADD COLUMN IF NOT EXISTS search_vector tsvector;'
+    f'UPDATE recipes_recipe SET search_vector = {SEARCH_VECTOR};'
+    'CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector '
+    'ON recipes_recipe USING gin (search_vector);'
+)
+DROP_COLUMN = (
+    'DROP INDEX IF EXISTS recipes_recipe_search_vector;'
+    'ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector;'
+)
+
+
+def create_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_COLUMN)
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_COLUMN)
+
+
+class Migration(migrations.Migration):
+    """
+    Колонка tsvector с весами названия, ингредиентов и описания и
+    GIN-индекс по ней. Колонка не объявлена в модели, чтобы не читать
+    её в каждом запросе рецептов, и обновляется функцией
+    api.search.reindex_recipes. На остальных СУБД поиск работает по
+    индексу в памяти процесса.
+    """
+
+    dependencies = [
+        ('recipes', '0008_recipe_author_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_vector, drop_search_vector),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Картинка, для которой созданы WebP-версии: адреса версий строятся
+    без проверки файлов в хранилище. У существующих рецептов поле
+    заполняет команда generate_renditions.
+    """
+
+    dependencies = [
+        ('recipes', '0010_similarrecipe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='renditions_image',
+            field=models.CharField(blank=True, editable=False, max_length=100, verbose_name='Картинка, для которой созданы версии'),
+        ),
+    ]
@@ -1,8 +1,10 @@
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import BooleanField, Exists, OuterRef, Value
 from django.conf import settings
 
-from users.models import User
+from users.counters import CounterFieldsMixin
+from users.models import Follow, User
 
 
 class Ingredient(models.Model):
@@ -19,6 +21,12 @@ class Ingredient(models.Model):
         ordering = ['name']
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            )
+        ]
 
     def __str__(self):
         return self.name
@@ -50,7 +58,45 @@ class Tag(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+
+    def with_tags(self, slugs):
+        """Рецепты с любым из тегов: полусоединение EXISTS без DISTINCT."""
+        return self.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'), tag__slug__in=set(slugs))))
+
+    def favorited_by(self, user):
+        return self.filter(Exists(Favorite.objects.filter(
+            user=user, recipe=OuterRef('pk'))))
+
+    def in_cart_of(self, user):
+        return self.filter(Exists(ShoppingCart.objects.filter(
+            user=user, recipe=OuterRef('pk'))))
+
+    def with_user_flags(self, user):
+        """
+        Добавляет к рецептам флаги is_favorited, is_in_shopping_cart
+        и is_subscribed автора одним запросом через подзапросы EXISTS.
+        """
+        recipes = self.select_related('author')
+        if not user.is_authenticated:
+            false = Value(False, output_field=BooleanField())
+            return recipes.annotate(
+                is_favorited=false,
+                is_in_shopping_cart=false,
+                author_is_subscribed=false
+            )
+        return recipes.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            author_is_subscribed=Exists(Follow.objects.filter(
+                user=user, following=OuterRef('author')))
+        )
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     tags = models.ManyToManyField(
         Tag,
         verbose_name='Теги'
@@ -85,11 +131,51 @@ class Recipe(models.Model):
         ],
         verbose_name='Время приготовления'
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число добавлений в избранное'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число добавлений в список покупок'
+    )
+    fanned_out = models.BooleanField(
+        default=True,
+        editable=False,
+        verbose_name='Разослан в ленты подписчиков'
+    )
+    renditions_image = models.CharField(
+        max_length=100,
+        blank=True,
+        editable=False,
+        verbose_name='Картинка, для которой созданы версии'
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    counter_fields = ('favorites_count', 'in_carts_count')
 
     class Meta:
         ordering = ['name']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipe_popular_idx'
+            ),
+            models.Index(
+                fields=['author', '-id'],
+                name='recipe_author_idx'
+            ),
+            models.Index(
+                fields=['author', '-id'],
+                name='recipe_pull_feed_idx',
+                condition=models.Q(fanned_out=False)
+            )
+        ]
 
     def __str__(self):
         return self.name
@@ -180,3 +266,70 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.user.username} - {self.recipe.name}'
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+
+    class Meta:
+        ordering = ['-recipe']
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} - {self.recipe_id}'
+
+
+class SimilarRecipe(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField(
+        verbose_name='Сходство'
+    )
+
+    class Meta:
+        ordering = ['recipe', '-score']
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'],
+                name='similar_recipe_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} - {self.similar_id}'
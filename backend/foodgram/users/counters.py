@@ -0,0 +1,53 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models import F
+
+counted_in_bulk = ContextVar('counted_in_bulk', default=False)
+
+
+class CounterFieldsMixin:
+    """
+    Не перезаписывает денормализованные счётчики при сохранении
+    существующего объекта: они меняются только через change_counter.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding
+                and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно изменяет счётчик в базе, не опуская его ниже нуля."""
+    change_counters(model, [pk], field, delta)
+
+
+def change_counters(model, pks, field, delta):
+    """Изменяет счётчик сразу у нескольких объектов одним запросом."""
+    if not pks:
+        return
+    queryset = model.objects.filter(pk__in=pks)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+@contextmanager
+def count_in_bulk():
+    """
+    Внутри блока сигналы не меняют счётчики: пакетный код сам изменяет
+    их одним запросом через change_counters.
+    """
+    token = counted_in_bulk.set(True)
+    try:
+        yield
+    finally:
+        counted_in_bulk.reset(token)
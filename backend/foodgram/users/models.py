@@ -1,10 +1,11 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from users.counters import CounterFieldsMixin
 from users.validators import username_validator
 
 
-class User(AbstractUser):
+class User(CounterFieldsMixin, AbstractUser):
     email = models.EmailField(
         max_length=254,
         unique=True,
@@ -24,6 +25,18 @@ class User(AbstractUser):
         max_length=150,
         verbose_name='Фамилия'
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число рецептов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число подписчиков'
+    )
+
+    counter_fields = ('recipes_count', 'followers_count')
 
     class Meta:
         ordering = ['username']